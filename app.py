@@ -1,10 +1,20 @@
 import streamlit as st
 import numpy as np
 from PIL import Image
-import tensorflow as tf
 import base64
+import hashlib
 from io import BytesIO
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "python"))
+from cache import ResultCache, cache_key, file_digest
+from encoders import encode, extension, mimetype
+from frames import encode_frames, is_multiframe, output_format, restore_frames
+from imaging import MODEL_INPUT_SIZE, load_for_model
+from inference import BACKEND, PRECISION, load_predictor, to_pixels, warm_up
+from tiling import BATCH_SIZE, restore_tiled
+from uploads import MAX_PIXELS, MAX_UPLOAD_BYTES, MAX_UPLOAD_MB, TooManyPixels, open_checked
 
 # === Konfigurasi Halaman ===
 st.set_page_config(
@@ -13,20 +23,28 @@ st.set_page_config(
     layout="wide"
 )
 
+# Path model yang benar
+MODEL_PATH = "model/model_restorasi_citra.h5"
+# Pratinjau gambar asli diperkecil ke ukuran ini sebelum di-cache
+PREVIEW_SIZE = (800, 800)
+PREVIEW_CACHE_ENTRIES = 16
+
 # === Load Model ===
 @st.cache_resource
 def load_restore_model():
     try:
-        # Path model yang benar
-        MODEL_PATH = "model/model_restorasi_citra.h5"
-        
         if not os.path.exists(MODEL_PATH):
             st.error(f"❌ File model tidak ditemukan di: {MODEL_PATH}")
             st.info("💡 Pastikan file model_restorasi_citra.h5 ada di folder 'model/'")
             return None
         
-        model = tf.keras.models.load_model(MODEL_PATH)
-        st.success("✅ Model berhasil dimuat!")
+        # Backend dipilih lewat RESTORE_BACKEND ("tf" atau "numpy");
+        # graph TensorFlow di-trace sekali saat model dimuat
+        model = load_predictor(MODEL_PATH, backend=BACKEND)
+        # Warm-up untuk ukuran batch mode cepat (1) dan mode tiled
+        duration = warm_up(model, [1, BATCH_SIZE])
+        print(f"🔥 Warm-up selesai dalam {duration:.2f} s")
+        st.success(f"✅ Model berhasil dimuat! (warm-up {duration:.2f} s)")
         return model
     except Exception as e:
         st.error(f"❌ Gagal memuat model: {str(e)}")
@@ -35,6 +53,90 @@ def load_restore_model():
 # Load model
 model = load_restore_model()
 
+# === Restorasi ===
+def restore_image(img, fast=False, size=None):
+    # Restorasi satu gambar atau satu frame. Mode tiled bekerja pada resolusi
+    # asli; mode cepat memproses versi 128x128 lalu memperbesarnya kembali ke
+    # `size` (default: ukuran img)
+    uint8_io = getattr(model, "uint8_io", False)
+    if not fast:
+        # Restorasi per tile pada resolusi asli
+        if model:
+            predict_fn = model
+        else:
+            # Fallback: return original
+            predict_fn = lambda batch: batch
+        return Image.fromarray(restore_tiled(np.array(img.convert("RGB")), predict_fn, uint8_io=uint8_io))
+
+    size = size or img.size
+    img_resized = load_for_model(img, MODEL_INPUT_SIZE)
+    if uint8_io:
+        # Graph uint8 / model int8: piksel masuk dan keluar langsung
+        restored_array = model(np.array(img_resized)[None])[0]
+    else:
+        img_array = np.array(img_resized)[None] / np.float32(255.0)
+
+        # Prediction
+        if model:
+            restored_array = model(img_array)[0]
+        else:
+            # Fallback: return original
+            restored_array = img_array[0]
+
+        # Postprocessing
+        restored_array = to_pixels(restored_array)
+    restored_img = Image.fromarray(restored_array)
+
+    # Resize back to original dimensions for display
+    return restored_img.resize(size, Image.Resampling.LANCZOS)
+
+# === Cache per Upload ===
+# Streamlit menjalankan ulang seluruh skrip di setiap interaksi widget. Decode
+# gambar asli dan hasil restorasi di-cache per hash upload sehingga rerun
+# tidak mengulang pekerjaan yang sama.
+@st.cache_resource
+def get_result_cache():
+    # Byte hasil encode, dipakai bersama semua sesi; anggaran byte lewat
+    # RESTORE_CACHE_MB (lihat python/cache.py)
+    return ResultCache()
+
+
+@st.cache_resource
+def get_model_key():
+    return f"{file_digest(MODEL_PATH)}:{BACKEND}:{PRECISION}"
+
+
+@st.cache_data(max_entries=PREVIEW_CACHE_ENTRIES, show_spinner=False)
+def inspect_upload(upload_hash, _data):
+    # Decode sekali per upload: pratinjau kecil, ukuran asli dan jumlah frame.
+    # Argumen berawalan "_" tidak ikut di-hash Streamlit; kuncinya upload_hash.
+    source = open_checked(BytesIO(_data))  # dimensi diperiksa dari header sebelum decode
+    multiframe = is_multiframe(source)
+    n_frames = source.n_frames if multiframe else 1
+    preview = source.convert("RGB")
+    size = preview.size
+    preview.thumbnail(PREVIEW_SIZE)
+    return preview, size, multiframe, n_frames
+
+
+def restore_upload(data, size, multiframe, fast, fmt, options):
+    # Decode -> restorasi -> encode; mengembalikan (byte hasil, format, ms encode)
+    source = open_checked(BytesIO(data))
+    if multiframe:
+        # Frame didecode, direstorasi dan di-encode bertahap
+        fmt = output_format(source, fmt)
+        frames = restore_frames(source, lambda frame: restore_image(frame, fast))
+        data, encode_ms = encode_frames(frames, fmt, loop=source.info.get("loop"))
+        return data, fmt, encode_ms
+    if fast:
+        # Preprocessing: decode langsung pada skala kecil (draft JPEG / reduce)
+        # alih-alih resize dari resolusi penuh
+        restored = restore_image(source, fast, size)
+    else:
+        restored = restore_image(source.convert("RGB"), fast)
+    data, encode_ms = encode(restored, fmt, options)
+    return data, fmt, encode_ms
+
 # === UI Streamlit ===
 st.title("🧠 Aplikasi Restorasi Citra Digital")
 st.markdown("Unggah gambar yang ingin direstorasi, dan sistem akan memperkinya.")
@@ -48,68 +150,101 @@ else:
 # Upload section
 st.subheader("📤 Upload Gambar")
 uploaded_file = st.file_uploader(
-    "Pilih file gambar (JPG, JPEG, PNG):",
-    type=["jpg", "jpeg", "png"],
-    help="Maksimal ukuran file: 200MB"
+    "Pilih file gambar (JPG, JPEG, PNG, GIF, TIFF, WebP):",
+    type=["jpg", "jpeg", "png", "gif", "tif", "tiff", "webp"],
+    help=f"Maksimal ukuran file: {MAX_UPLOAD_MB}MB, resolusi maksimal {MAX_PIXELS / 1e6:.0f} megapiksel"
 )
 
 if uploaded_file is not None:
     # Process the image
     try:
-        image = Image.open(uploaded_file).convert("RGB")
+        # Streamlit menahan seluruh upload di memori; batas byte diatur juga
+        # lewat server.maxUploadSize di .streamlit/config.toml
+        if uploaded_file.size > MAX_UPLOAD_BYTES:
+            st.error(f"❌ Ukuran file melebihi batas {MAX_UPLOAD_MB}MB")
+            st.stop()
+        upload = uploaded_file.getvalue()
+        upload_hash = hashlib.sha256(upload).hexdigest()
+        # GIF/APNG/WebP animasi dan TIFF multi-halaman direstorasi per frame
+        preview, size, multiframe, n_frames = inspect_upload(upload_hash, upload)
         
         # Display original image
         col1, col2 = st.columns(2)
         
         with col1:
             st.subheader("🖼️ Gambar Asli")
-            st.image(image, width=400)  # HAPUS use_column_width, gunakan width saja
+            st.image(preview, width=400)  # HAPUS use_column_width, gunakan width saja
+            if multiframe:
+                st.caption(f"🎞️ {n_frames} frame (ditampilkan frame pertama)")
+
+        # Mode restorasi: tiled (resolusi asli) atau cepat 128x128
+        mode = st.radio(
+            "Mode restorasi:",
+            ["Resolusi asli (tiled)", "Cepat (128x128)"],
+            horizontal=True,
+            help="Mode tiled memproses gambar per tile 128x128 tanpa mengubah ukuran"
+        )
+        fast = not mode.startswith("Resolusi asli")
+
+        # Format unduhan: JPEG paling cepat, WebP lebih kecil, PNG tanpa kehilangan.
+        # Hasil multi-frame memakai format sumber bila format pilihan tidak
+        # mendukung banyak frame.
+        download_format = st.radio(
+            "Format unduhan:",
+            ["JPEG", "WebP", "PNG"],
+            horizontal=True,
+        )
+        fmt = download_format.lower()
+        options = {"quality": 95} if fmt == "jpeg" else {}
+
+        # Hasil yang pernah diproses di sesi ini tetap tampil setelah rerun
+        result_cache = get_result_cache()
+        key = cache_key(upload_hash, get_model_key() if model else "fallback",
+                        "resize" if fast else "tiled", fmt, options)
+        restored_keys = st.session_state.setdefault("restored_keys", set())
+        result = result_cache.get(key) if key in restored_keys else None
+        encode_ms = None
 
         # Restoration button - HAPUS use_column_width
-        if st.button("🔧 PROSES RESTORASI", type="primary"):
-            with st.spinner("🔄 Sedang memproses gambar... Mohon tunggu"):
-                try:
-                    # Preprocessing
-                    target_size = (128, 128)  # Ses dengan input model
-                    img_resized = image.resize(target_size)
-                    img_array = np.array(img_resized) / 255.0
-                    img_array = np.expand_dims(img_array, axis=0)
-
-                    # Prediction
-                    if model:
-                        restored_array = model.predict(img_array, verbose=0)[0]
-                        st.success("✅ Restorasi menggunakan model berhasil!")
-                    else:
-                        # Fallback: return original
-                        restored_array = img_array[0]
-                        st.info("ℹ️ Menggunakan processing dasar")
-
-                    # Postprocessing
-                    restored_array = (restored_array * 255).astype(np.uint8)
-                    restored_img = Image.fromarray(restored_array)
-                    
-                    # Resize back to original dimensions for display
-                    restored_display = restored_img.resize(image.size, Image.Resampling.LANCZOS)
-
-                    with col2:
-                        st.subheader("✨ Hasil Restorasi")
-                        st.image(restored_display, width=400)  # HAPUS use_column_width, gunakan width
-                        
-                        # Download button - HAPUS use_column_width
-                        buffer = BytesIO()
-                        restored_display.save(buffer, format="JPEG", quality=95)
-                        buffer.seek(0)
-                        
-                        st.download_button(
-                            label="⬇️ DOWNLOAD HASIL",
-                            data=buffer,
-                            file_name="hasil_restorasi.jpg",
-                            mime="image/jpeg"
-                        )
-
-                except Exception as e:
-                    st.error(f"❌ Error selama proses restorasi: {str(e)}")
+        if st.button("🔧 PROSES RESTORASI", type="primary") and result is None:
+            # Upload yang sama mungkin sudah diproses sesi lain
+            result = result_cache.get(key)
+            if result is None:
+                with st.spinner("🔄 Sedang memproses gambar... Mohon tunggu"):
+                    try:
+                        data, out_fmt, encode_ms = restore_upload(upload, size, multiframe, fast, fmt, options)
+                        result = (data, out_fmt)
+                        result_cache.put(key, data, out_fmt)
+                    except Exception as e:
+                        st.error(f"❌ Error selama proses restorasi: {str(e)}")
+            if result is not None:
+                restored_keys.add(key)
+
+        if result is not None:
+            data, out_fmt = result
+            if model:
+                st.success("✅ Restorasi menggunakan model berhasil!")
+            else:
+                st.info("ℹ️ Menggunakan processing dasar")
+
+            with col2:
+                st.subheader("✨ Hasil Restorasi")
+                # Browser tidak bisa menampilkan TIFF; tampilkan halaman pertama
+                restored_display = Image.open(BytesIO(data)) if out_fmt == "tiff" else data
+                st.image(restored_display, width=400)  # HAPUS use_column_width, gunakan width
+                
+                # Download button - HAPUS use_column_width
+                cost = f"encode {encode_ms:.0f} ms" if encode_ms is not None else "dari cache"
+                st.caption(f"{out_fmt.upper()}: {len(data) / 1024:.0f} KB, {cost}")
+                
+                st.download_button(
+                    label="⬇️ DOWNLOAD HASIL",
+                    data=data,
+                    file_name="hasil_restorasi" + extension(out_fmt),
+                    mime=mimetype(out_fmt)
+                )
                     
+    except TooManyPixels as e:
+        st.error(f"❌ {str(e)}")
     except Exception as e:
         st.error(f"❌ Error memproses gambar: {str(e)}")
-
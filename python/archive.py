@@ -0,0 +1,72 @@
+import os
+import zipfile
+from io import BytesIO
+
+from imaging import IMAGE_EXTENSIONS
+from uploads import MAX_UPLOAD_BYTES, UploadTooLarge
+
+# === Arsip ZIP untuk Restorasi Batch ===
+# Batas jumlah gambar per batch (termasuk isi ZIP)
+MAX_BATCH_FILES = int(os.environ.get("RESTORE_MAX_BATCH_FILES", "500"))
+
+
+class ZipStream:
+    """Target tulis tak-seekable untuk `zipfile.ZipFile`.
+
+    Byte yang ditulis ZipFile dikumpulkan lalu diambil dengan `pop()`, sehingga
+    arsip hasil bisa dikirim per entri tanpa menahan seluruh arsip di memori.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def is_zip(name, mimetype=""):
+    return name.lower().endswith(".zip") or mimetype in ("application/zip", "application/x-zip-compressed")
+
+
+def iter_zip_images(fileobj, limit=MAX_UPLOAD_BYTES):
+    """Hasilkan (nama, opener) untuk setiap gambar di dalam arsip ZIP.
+
+    `opener()` membaca satu entri ke memori; ukuran hasil dekompresi dibatasi
+    `limit` sehingga zip bomb berhenti dibaca begitu melewati batas.
+    """
+    archive = zipfile.ZipFile(fileobj)
+    for info in archive.infolist():
+        if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+
+        def opener(info=info):
+            if info.file_size > limit:
+                raise UploadTooLarge(f"{info.filename} melebihi batas {limit // (1024 * 1024)} MB")
+            with archive.open(info) as member:
+                data = member.read(limit + 1)
+            if len(data) > limit:
+                raise UploadTooLarge(f"{info.filename} melebihi batas {limit // (1024 * 1024)} MB")
+            return BytesIO(data)
+
+        yield info.filename, opener
+
+
+def output_name(name, used, ext=".jpg"):
+    # Nama entri hasil: nama asli dengan ekstensi baru, dibuat unik
+    base = os.path.splitext(name.replace("\\", "/").lstrip("/"))[0] or "gambar"
+    candidate = base + ext
+    counter = 1
+    while candidate in used:
+        candidate = f"{base}_{counter}{ext}"
+        counter += 1
+    used.add(candidate)
+    return candidate
@@ -0,0 +1,481 @@
+import os
+import struct
+import zlib
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from tiling import BATCH_SIZE, HALO, TILE_SIZE, restore_tiled
+
+# === Restorasi Out-of-core per Band ===
+# Gambar yang terlalu besar untuk memori (peta hasil scan, panorama ratusan
+# megapiksel) dibaca per band horizontal, direstorasi per tile, lalu hasilnya
+# langsung ditulis ke memmap .npy atau writer PNG/TIFF bertahap. Setiap band
+# membawa HALO baris konteks di atas dan bawahnya, sehingga hasilnya identik
+# dengan restore_tiled pada gambar utuh (termasuk batasan gambar yang lebih
+# sempit dari satu tile) dan memori hanya bergantung pada lebar gambar.
+
+# Baris inti per band: empat baris tile penuh dikurangi halo, sehingga band
+# beserta konteksnya tepat menjadi 4 x 118 baris tanpa tile sisa
+BAND_ROWS = int(os.environ.get("RESTORE_BAND_ROWS", str(4 * (TILE_SIZE - 2 * HALO) - 2 * HALO)))
+# Batas piksel untuk mode ini; batas upload biasa (RESTORE_MAX_PIXELS) tetap
+# berlaku untuk server
+MAX_PIXELS = int(os.environ.get("RESTORE_MAX_PIXELS_LARGE", "2000000000"))
+OUTPUT_EXTENSIONS = (".npy", ".png", ".tif", ".tiff")
+# Format yang tidak bisa dibaca per band (JPEG, TIFF terkompresi, PNG 16-bit
+# atau interlaced) harus didecode penuh; di atas anggaran memori ini ditolak
+DECODE_MAX_MB = int(os.environ.get("RESTORE_DECODE_MAX_MB", "1024"))
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Byte per piksel PNG 8-bit per color type (abu-abu, RGB, palet, abu-abu+alfa, RGBA)
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+def _open_image(path):
+    # Seperti Image.open, tetapi tanpa pemeriksaan decompression bomb terhadap
+    # Image.MAX_IMAGE_PIXELS global; BandReader memeriksa batas pikselnya sendiri
+    Image.init()
+    with open(path, "rb") as f:
+        prefix = f.read(16)
+    for format_id in Image.ID:
+        factory, accept = Image.OPEN[format_id]
+        if accept and not accept(prefix):
+            continue
+        try:
+            return factory(path)
+        except (SyntaxError, IndexError, TypeError, struct.error):
+            continue
+    raise Image.UnidentifiedImageError(f"Format gambar tidak dikenali: {path}")
+
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)))
+
+
+class PngRowReader:
+    """Pembaca PNG 8-bit non-interlaced baris demi baris secara berurutan.
+
+    Stream IDAT didekompresi bertahap (zlib decompressobj) hanya sebanyak
+    baris yang diminta. Baris yang masih terfilter dibungkus ulang menjadi PNG
+    kecil tak terkompresi dengan baris asli sebelumnya (filter None) sebagai
+    baris pertama, sehingga unfilter Up/Average/Paeth dikerjakan decoder
+    Pillow. `read()` harus dipanggil dengan y0 yang tidak mundur melewati
+    band sebelumnya; bila mundur, pembacaan diulang dari awal file.
+    """
+
+    def __init__(self, path, header):
+        self.path = path
+        self.width, self.height, self._ihdr_tail, self._extra, self._row_bytes = header
+        self._restart()
+
+    @staticmethod
+    def header(path):
+        # (lebar, tinggi, sisa IHDR, chunk PLTE/tRNS, byte per baris) atau
+        # None bila PNG tidak bisa dibaca per baris
+        with open(path, "rb") as f:
+            if f.read(8) != PNG_SIGNATURE:
+                return None
+            extra = b""
+            ihdr = None
+            while True:
+                head = f.read(8)
+                if len(head) < 8:
+                    return None
+                length, kind = struct.unpack(">I4s", head)
+                data = f.read(length)
+                f.read(4)
+                if kind == b"IHDR":
+                    ihdr = data
+                elif kind in (b"PLTE", b"tRNS"):
+                    extra += _png_chunk(kind, data)
+                elif kind == b"IDAT":
+                    break
+        width, height, depth, color, _, _, interlace = struct.unpack(">IIBBBBB", ihdr)
+        if depth != 8 or interlace or color not in PNG_CHANNELS:
+            return None
+        return width, height, ihdr[8:], extra, width * PNG_CHANNELS[color]
+
+    def _restart(self):
+        if getattr(self, "_f", None):
+            self._f.close()
+        self._f = open(self.path, "rb")
+        self._f.seek(8)
+        self._zlib = zlib.decompressobj()
+        self._pending = bytearray()
+        self._in_idat = False
+        self._prev = None
+        self._rows = np.empty((0, self.width, 3), dtype=np.uint8)
+        self._rows_y0 = 0
+
+    def _next_idat(self):
+        # Data chunk IDAT berikutnya; chunk selain IDAT dilewati sampai IDAT
+        # pertama, lalu dianggap akhir stream
+        while True:
+            head = self._f.read(8)
+            if len(head) < 8:
+                raise ValueError("File PNG terpotong")
+            length, kind = struct.unpack(">I4s", head)
+            if kind == b"IDAT":
+                self._in_idat = True
+                data = self._f.read(length)
+                self._f.read(4)
+                return data
+            if self._in_idat:
+                raise ValueError("Data IDAT PNG kurang dari tinggi gambar")
+            self._f.seek(length + 4, os.SEEK_CUR)
+
+    def _decode(self, count):
+        size = count * (1 + self._row_bytes)
+        while len(self._pending) < size:
+            data = self._zlib.unconsumed_tail or self._next_idat()
+            # max_length membatasi hasil dekompresi; data yang sangat mudah
+            # dikompres tidak pernah mengembang melebihi band yang diminta
+            self._pending += self._zlib.decompress(data, size - len(self._pending))
+        filtered = bytes(self._pending[:size])
+        del self._pending[:size]
+
+        height = count
+        if self._prev is not None:
+            filtered = b"\x00" + self._prev + filtered
+            height += 1
+        png = (PNG_SIGNATURE
+               + _png_chunk(b"IHDR", struct.pack(">II", self.width, height) + self._ihdr_tail)
+               + self._extra
+               + _png_chunk(b"IDAT", zlib.compress(filtered, 0))
+               + _png_chunk(b"IEND", b""))
+        with Image.open(BytesIO(png)) as img:
+            img.load()
+            self._prev = img.crop((0, height - 1, self.width, height)).tobytes()
+            return np.asarray(img.convert("RGB"))[height - count:]
+
+    def read(self, y0, y1):
+        if y0 < self._rows_y0:
+            self._restart()
+        rows_y1 = self._rows_y0 + len(self._rows)
+        if y0 >= rows_y1:
+            # Lewati baris sebelum y0 yang belum pernah diminta
+            if y0 > rows_y1:
+                self._decode(y0 - rows_y1)
+            rows = self._decode(y1 - y0)
+        else:
+            kept = self._rows[y0 - self._rows_y0:y1 - self._rows_y0]
+            rows = kept if y1 <= rows_y1 else np.concatenate([kept, self._decode(y1 - rows_y1)])
+        self._rows, self._rows_y0 = rows, y0
+        return rows
+
+    def close(self):
+        self._f.close()
+
+
+class BandReader:
+    """Pembaca baris [y0, y1) dari file gambar sebagai array uint8 (h, W, 3).
+
+    .npy dibuka sebagai memmap. Format tak terkompresi (TIFF, BMP, PPM)
+    dibaca langsung per band dengan mempersempit tile list Pillow ke offset
+    baris yang diminta, dan PNG 8-bit non-interlaced didekompresi bertahap
+    (PngRowReader). Format lain tidak bisa didecode sebagian, jadi didecode
+    penuh sekali (uint8, bukan float) lalu disalin ke memmap sementara; bila
+    itu butuh lebih dari `decode_max_mb`, gambar ditolak.
+    """
+
+    def __init__(self, path, max_pixels=MAX_PIXELS, decode_max_mb=DECODE_MAX_MB):
+        self.path = path
+        self._array = None
+        self._spool = None
+        self._png = None
+        if path.lower().endswith(".npy"):
+            self._array = np.load(path, mmap_mode="r")
+            self.height, self.width = self._array.shape[:2]
+            self._check(max_pixels)
+            return
+
+        png_header = PngRowReader.header(path)
+        if png_header is not None:
+            self._png = PngRowReader(path, png_header)
+            self.width, self.height = self._png.width, self._png.height
+            self._check(max_pixels)
+            return
+
+        with _open_image(path) as img:
+            self.width, self.height = img.size
+            self._check(max_pixels)
+            self._rows = self._raw_rows(img)
+            # Decode penuh menahan gambar dalam mode aslinya dan salinan RGB
+            decode_mb = self.width * self.height * (len(img.getbands()) + 3) / (1024 * 1024)
+        if self._rows is None:
+            if decode_mb > decode_max_mb:
+                raise ValueError(
+                    f"{os.path.basename(path)} tidak bisa dibaca per band dan butuh ~{decode_mb:.0f} MB "
+                    f"untuk didecode penuh (batas RESTORE_DECODE_MAX_MB={decode_max_mb}); konversi "
+                    "dulu ke TIFF tak terkompresi atau PNG 8-bit non-interlaced"
+                )
+            print(f"⚠️ {os.path.basename(path)} tidak bisa dibaca per band; didecode penuh sekali")
+            self._array = self._spool_to_memmap()
+
+    def _check(self, max_pixels):
+        if self.width * self.height > max_pixels:
+            raise ValueError(
+                f"Resolusi {self.width}x{self.height} melebihi batas {max_pixels / 1e6:.0f} megapiksel"
+            )
+
+    @staticmethod
+    def _raw_rows(img):
+        # Daftar (y0, y1, x0, x1, offset, rawmode, stride, orientasi) untuk
+        # setiap tile "raw"; None bila ada tile yang terkompresi
+        rows = []
+        for decoder, (x0, y0, x1, y1), offset, args in img.tile:
+            if decoder != "raw":
+                return None
+            if isinstance(args, str):
+                args = (args, 0, 1)
+            rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+            if not stride:
+                try:
+                    stride = len(Image.new(img.mode, (x1 - x0, 1)).tobytes("raw", rawmode))
+                except ValueError:
+                    return None
+            rows.append((y0, y1, x0, x1, offset, rawmode, stride, orientation))
+        return rows
+
+    def _spool_to_memmap(self):
+        import tempfile
+
+        self._spool = tempfile.NamedTemporaryFile(suffix=".npy", delete=False)
+        self._spool.close()
+        array = np.lib.format.open_memmap(
+            self._spool.name, mode="w+", dtype=np.uint8, shape=(self.height, self.width, 3)
+        )
+        with _open_image(self.path) as img:
+            img = img.convert("RGB")
+            for y0 in range(0, self.height, BAND_ROWS):
+                y1 = min(y0 + BAND_ROWS, self.height)
+                array[y0:y1] = np.asarray(img.crop((0, y0, self.width, y1)))
+        array.flush()
+        return array
+
+    def read(self, y0, y1):
+        if self._array is not None:
+            return np.ascontiguousarray(self._array[y0:y1, :, :3])
+        if self._png is not None:
+            return self._png.read(y0, y1)
+
+        # Buka ulang file dan sisakan hanya bagian tile yang memuat baris band
+        img = _open_image(self.path)
+        tiles = []
+        for ty0, ty1, x0, x1, offset, rawmode, stride, orientation in self._rows:
+            a, b = max(y0, ty0), min(y1, ty1)
+            if a >= b:
+                continue
+            if orientation < 0:
+                # Baris disimpan dari bawah ke atas (BMP)
+                start = offset + (ty1 - b) * stride
+            else:
+                start = offset + (a - ty0) * stride
+            tiles.append(("raw", (x0, a - y0, x1, b - y0), start, (rawmode, stride, orientation)))
+        img._size = (self.width, y1 - y0)
+        img.tile = tiles
+        with img:
+            return np.asarray(img.convert("RGB"))
+
+    def close(self):
+        self._array = None
+        if self._png is not None:
+            self._png.close()
+            self._png = None
+        if self._spool is not None:
+            os.unlink(self._spool.name)
+            self._spool = None
+
+
+class NpyWriter:
+    # Hasil sebagai array .npy yang dipetakan ke memori
+    def __init__(self, path, width, height):
+        self._array = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=(height, width, 3))
+        self._y = 0
+
+    def write(self, rows):
+        self._array[self._y:self._y + len(rows)] = rows
+        self._y += len(rows)
+
+    def close(self):
+        self._array.flush()
+        self._array = None
+
+    def abort(self):
+        self._array = None
+
+
+def _sub_filter(rows):
+    # Filter "Sub" PNG / predictor horizontal TIFF: selisih dengan piksel di
+    # kirinya (modulo 256); membuat hasil deflate jauh lebih kecil
+    filtered = rows.copy()
+    filtered[:, 1:] -= rows[:, :-1]
+    return filtered
+
+
+class PngWriter:
+    """Writer PNG RGB 8-bit yang menerima baris secara bertahap.
+
+    Baris difilter "Sub" lalu dikompres dengan zlib streaming; chunk IDAT
+    ditulis begitu buffer kompresi terisi, sehingga gambar tidak pernah
+    utuh di memori.
+    """
+
+    CHUNK_BYTES = 1 << 20
+
+    def __init__(self, path, width, height, compress_level=6):
+        self._f = open(path, "wb")
+        self._f.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        self._zlib = zlib.compressobj(compress_level)
+        self._pending = []
+        self._pending_bytes = 0
+
+    def _chunk(self, kind, data):
+        self._f.write(struct.pack(">I", len(data)) + kind + data)
+        self._f.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
+
+    def _emit(self, data, force=False):
+        if data:
+            self._pending.append(data)
+            self._pending_bytes += len(data)
+        if self._pending_bytes >= self.CHUNK_BYTES or (force and self._pending):
+            self._chunk(b"IDAT", b"".join(self._pending))
+            self._pending.clear()
+            self._pending_bytes = 0
+
+    def write(self, rows):
+        height, width = rows.shape[:2]
+        scanlines = np.empty((height, 1 + width * 3), dtype=np.uint8)
+        scanlines[:, 0] = 1  # filter Sub
+        scanlines[:, 1:] = _sub_filter(rows).reshape(height, -1)
+        self._emit(self._zlib.compress(scanlines.tobytes()))
+
+    def close(self):
+        self._emit(self._zlib.flush(), force=True)
+        self._chunk(b"IEND", b"")
+        self._f.close()
+
+    def abort(self):
+        self._f.close()
+
+
+class TiffWriter:
+    """Writer TIFF RGB 8-bit bertahap: satu strip per band.
+
+    Strip ditulis berurutan; daftar offset strip dan IFD ditulis di akhir
+    file. Strip dikompres deflate (predictor horizontal); dengan
+    `compress_level=0` hasilnya tak terkompresi dan bisa dibaca ulang per band.
+    Format TIFF klasik dibatasi 4 GB.
+    """
+
+    def __init__(self, path, width, height, rows_per_strip, compress_level=6):
+        self._f = open(path, "wb")
+        self._f.write(b"II*\x00\x00\x00\x00\x00")
+        self.width, self.height = width, height
+        self.rows_per_strip = rows_per_strip
+        self.compress_level = compress_level
+        self._offsets = []
+        self._counts = []
+
+    def write(self, rows):
+        # Band terakhir boleh lebih pendek; band lain harus tepat satu strip
+        if len(rows) != self.rows_per_strip and self._written() + len(rows) != self.height:
+            raise ValueError("Tinggi band harus sama dengan rows_per_strip")
+        if self.compress_level:
+            data = zlib.compress(_sub_filter(rows).tobytes(), self.compress_level)
+        else:
+            data = rows.tobytes()
+        self._offsets.append(self._f.tell())
+        self._counts.append(len(data))
+        self._f.write(data)
+        if self._f.tell() >= 1 << 32:
+            raise ValueError("Hasil melebihi batas 4 GB format TIFF klasik")
+
+    def _written(self):
+        return len(self._offsets) * self.rows_per_strip
+
+    def _array(self, values):
+        offset = self._f.tell()
+        self._f.write(struct.pack(f"<{len(values)}I", *values))
+        return offset
+
+    def close(self):
+        if self._f.tell() % 2:
+            self._f.write(b"\x00")
+        bits = self._f.tell()
+        self._f.write(struct.pack("<3H", 8, 8, 8))
+        offsets = self._array(self._offsets) if len(self._offsets) > 1 else self._offsets[0]
+        counts = self._array(self._counts) if len(self._counts) > 1 else self._counts[0]
+        # (tag, tipe, jumlah, nilai); tipe 3 = SHORT, 4 = LONG
+        entries = [
+            (256, 4, 1, self.width),
+            (257, 4, 1, self.height),
+            (258, 3, 3, bits),
+            (259, 3, 1, 8 if self.compress_level else 1),
+            (262, 3, 1, 2),
+            (273, 4, len(self._offsets), offsets),
+            (277, 3, 1, 3),
+            (278, 4, 1, self.rows_per_strip),
+            (279, 4, len(self._counts), counts),
+            (284, 3, 1, 1),
+        ]
+        if self.compress_level:
+            entries.append((317, 3, 1, 2))
+        ifd = self._f.tell()
+        self._f.write(struct.pack("<H", len(entries)))
+        for tag, kind, count, value in entries:
+            packed = struct.pack("<HH", value, 0) if kind == 3 and count == 1 else struct.pack("<I", value)
+            self._f.write(struct.pack("<HHI", tag, kind, count) + packed)
+        self._f.write(struct.pack("<I", 0))
+        self._f.seek(4)
+        self._f.write(struct.pack("<I", ifd))
+        self._f.close()
+
+    def abort(self):
+        self._f.close()
+
+
+def open_writer(path, width, height, band_rows=BAND_ROWS, compress_level=6):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        return NpyWriter(path, width, height)
+    if ext == ".png":
+        return PngWriter(path, width, height, compress_level=compress_level)
+    if ext in (".tif", ".tiff"):
+        return TiffWriter(path, width, height, band_rows, compress_level=compress_level)
+    raise ValueError(f"Format keluaran tidak didukung: {ext} (pilih {', '.join(OUTPUT_EXTENSIONS)})")
+
+
+def iter_bands(height, band_rows=BAND_ROWS, halo=HALO, tile=TILE_SIZE):
+    # Hasilkan (awal_baca, akhir_baca, awal_inti, akhir_inti). Window baca
+    # minimal setinggi satu tile supaya band terakhir yang pendek tidak
+    # dipadding reflect oleh restore_tiled.
+    for core_start in range(0, height, band_rows):
+        core_end = min(core_start + band_rows, height)
+        read_end = min(core_end + halo, height)
+        read_start = max(min(core_start - halo, read_end - tile), 0)
+        yield read_start, read_end, core_start, core_end
+
+
+def restore_banded(reader, writer, predict_fn, band_rows=BAND_ROWS, batch_size=BATCH_SIZE,
+                   uint8_io=False, progress=None):
+    """Restorasi `reader` band demi band ke `writer`.
+
+    Band berikutnya dibaca di thread terpisah selama band sekarang
+    direstorasi. Memori puncak sebanding dengan lebar x `band_rows`.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    bands = list(iter_bands(reader.height, band_rows))
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        next_band = pool.submit(reader.read, *bands[0][:2])
+        for i, (read_start, read_end, core_start, core_end) in enumerate(bands):
+            band = next_band.result()
+            if i + 1 < len(bands):
+                next_band = pool.submit(reader.read, *bands[i + 1][:2])
+            restored = restore_tiled(band, predict_fn, batch_size=batch_size, uint8_io=uint8_io)
+            writer.write(restored[core_start - read_start:core_end - read_start])
+            if progress:
+                progress(core_end, reader.height)
@@ -0,0 +1,88 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+# === Konfigurasi Micro-batching ===
+MAX_BATCH_SIZE = 32
+MAX_WAIT_MS = 5.0
+
+
+class MicroBatcher:
+    """Scheduler latar belakang yang menggabungkan request bersamaan.
+
+    Setiap pemanggil mengirim array [k, 128, 128, 3] (float32, atau uint8 untuk
+    model int8); scheduler mengumpulkan kiriman sampai total baris mencapai
+    `max_batch_size` atau batas tunggu `max_wait_ms` terlewati, menjalankan
+    `predict_fn` sekali untuk seluruh batch, lalu membagi hasilnya kembali ke
+    masing-masing pemanggil.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._carry = None
+        self.batches = 0
+        self.items = 0
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, batch):
+        future = Future()
+        self._queue.put((np.asarray(batch), future))
+        return future
+
+    def predict(self, batch):
+        return self.submit(batch).result()
+
+    def _next_item(self, timeout=None):
+        if self._carry is not None:
+            item, self._carry = self._carry, None
+            return item
+        return self._queue.get(timeout=timeout)
+
+    def _collect(self):
+        first = self._next_item()
+        items = [first]
+        total = len(first[0])
+        deadline = time.monotonic() + self.max_wait
+        while total < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._next_item(timeout=remaining)
+            except queue.Empty:
+                break
+            # Kiriman yang membuat batch melebihi batas ditunda ke batch berikutnya
+            if total + len(item[0]) > self.max_batch_size:
+                self._carry = item
+                break
+            items.append(item)
+            total += len(item[0])
+        return items
+
+    def _run(self):
+        while True:
+            items = self._collect()
+            items = [(arr, fut) for arr, fut in items if fut.set_running_or_notify_cancel()]
+            if not items:
+                continue
+            try:
+                inputs = items[0][0] if len(items) == 1 else np.concatenate([arr for arr, _ in items])
+                outputs = self.predict_fn(inputs)
+            except Exception as e:
+                for _, fut in items:
+                    fut.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(inputs)
+            offset = 0
+            for arr, fut in items:
+                fut.set_result(outputs[offset:offset + len(arr)])
+                offset += len(arr)
@@ -0,0 +1,290 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "../model/model_restorasi_citra.h5")
+
+
+def load_keras_model(path=MODEL_PATH):
+    from tensorflow.keras.models import load_model
+    return load_model(path)
+
+
+def _run_clients(predict_fn, clients, requests_per_client):
+    # Setiap klien mengirim request batch-1 secara berurutan
+    sample = np.random.rand(1, 128, 128, 3).astype(np.float32)
+
+    def worker():
+        for _ in range(requests_per_client):
+            predict_fn(sample)
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return clients * requests_per_client / elapsed
+
+
+def bench_batching(args):
+    from batching import MicroBatcher
+
+    model = load_keras_model()
+    direct = lambda batch: model.predict(batch, verbose=0)
+    batcher = MicroBatcher(direct, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    direct(np.zeros((1, 128, 128, 3), dtype=np.float32))
+
+    print(f"{'klien':>6} {'langsung (img/s)':>18} {'micro-batch (img/s)':>20} {'rata2 batch':>12}")
+    for clients in args.clients:
+        base = _run_clients(direct, clients, args.requests)
+        batcher.batches = batcher.items = 0
+        batched = _run_clients(batcher.predict, clients, args.requests)
+        avg = batcher.items / max(batcher.batches, 1)
+        print(f"{clients:>6} {base:>18.1f} {batched:>20.1f} {avg:>12.1f}")
+
+
+def _latency_ms(fn, batch, repeats):
+    fn(batch)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(batch)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def bench_latency(args):
+    from inference import CompiledModel, load_predictor
+
+    model = load_keras_model()
+    candidates = [
+        ("model.predict", lambda batch: model.predict(batch, verbose=0)),
+        ("tf.function", CompiledModel(model, jit_compile=False, uint8_io=False)),
+        ("tf.function uint8", CompiledModel(model, jit_compile=False, uint8_io=True)),
+    ]
+    if args.xla:
+        candidates.append(("tf.function+XLA", CompiledModel(model, jit_compile=True, uint8_io=False)))
+    for backend in args.backends:
+        candidates.append((backend, load_predictor(MODEL_PATH, backend=backend)))
+
+    print(f"{'batch':>6} " + " ".join(f"{name + ' (ms)':>22}" for name, _ in candidates))
+    for size in args.batch_sizes:
+        pixels = np.random.randint(0, 256, (size, 128, 128, 3), dtype=np.uint8)
+        floats = pixels / np.float32(255.0)
+        row = [
+            _latency_ms(fn, pixels if getattr(fn, "uint8_io", False) else floats, args.repeats)
+            for _, fn in candidates
+        ]
+        print(f"{size:>6} " + " ".join(f"{ms:>22.2f}" for ms in row))
+
+
+def bench_threads_probe(args):
+    # Dijalankan sebagai subprocess oleh `threads`: konfigurasi thread TF hanya
+    # bisa diatur sekali per proses
+    from inference import configure_threads, load_predictor, parse_cpu_list
+
+    configure_threads(args.intra, args.inter, parse_cpu_list(args.cpus))
+    model = load_predictor(MODEL_PATH)
+    dtype = np.uint8 if getattr(model, "uint8_io", False) else np.float32
+    batch = np.zeros((args.batch_size, 128, 128, 3), dtype=dtype)
+    model(batch)
+
+    done = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.duration:
+        model(batch)
+        done += len(batch)
+    print(done / (time.perf_counter() - start))
+
+
+def bench_threads(args):
+    from inference import available_cpus
+
+    cpus_available = available_cpus()
+    cpu_count = len(cpus_available)
+    intra_options = args.intra or sorted({2 ** i for i in range(cpu_count.bit_length())} | {cpu_count})
+    intra_options = [n for n in intra_options if n <= cpu_count]
+    env = dict(os.environ, RESTORE_BACKEND=args.backend)
+
+    print(f"🖥️ {cpu_count} CPU, backend {args.backend}, batch {args.batch_size}")
+    print(f"{'intra':>6} {'inter':>6} {'worker':>7} {'img/s':>10}")
+    results = []
+    for intra in intra_options:
+        workers = max(cpu_count // intra, 1)
+        for inter in args.inter:
+            # Jalankan satu proses per worker secara bersamaan, masing-masing
+            # dikunci ke core sendiri, lalu jumlahkan throughput-nya
+            procs = []
+            for slot in range(workers):
+                cpus = ",".join(str(cpus_available[(slot * intra + i) % cpu_count]) for i in range(intra))
+                procs.append(subprocess.Popen(
+                    [sys.executable, os.path.abspath(__file__), "threads-probe",
+                     "--intra", str(intra), "--inter", str(inter), "--cpus", cpus,
+                     "--batch-size", str(args.batch_size), "--duration", str(args.duration)],
+                    env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                ))
+            total = sum(float(p.communicate()[0].strip().splitlines()[-1]) for p in procs)
+            results.append((total, intra, inter, workers))
+            print(f"{intra:>6} {inter:>6} {workers:>7} {total:>10.1f}")
+
+    total, intra, inter, workers = max(results)
+    print(f"✅ Rekomendasi: {workers} worker x {intra} thread intra-op, {inter} inter-op ({total:.1f} img/s)")
+    print(f"   python serve.py --workers {workers} --threads-per-worker {intra} "
+          f"--inter-op-threads {inter} --pin-cpus")
+
+
+def bench_startup_probe(args):
+    # Dijalankan sebagai subprocess oleh `startup` agar setiap pengukuran
+    # dimulai dari proses baru
+    start = time.perf_counter()
+    import tensorflow as tf
+
+    from inference import CompiledModel, load_keras_model
+
+    imported = time.perf_counter()
+    if args.source == "h5":
+        model = tf.keras.models.load_model(MODEL_PATH)
+    else:
+        model = load_keras_model(MODEL_PATH, use_artifact=args.source == "artifact")
+    loaded = time.perf_counter()
+    predictor = CompiledModel(model)
+    predictor(np.zeros((1, 128, 128, 3), dtype=predictor.dtype))
+    ready = time.perf_counter()
+    print(imported - start, loaded - imported, ready - loaded)
+
+
+def bench_startup(args):
+    from inference import artifact_path
+
+    sources = [
+        ("h5", "load_model(.h5)"),
+        ("h5-nocompile", "load_model(compile=False)"),
+        ("artifact", "artifact .npz"),
+    ]
+    artifact = artifact_path(MODEL_PATH)
+    print(f"Artifact: {artifact}")
+    print(f"{'sumber':<26} {'import tf (s)':>14} {'muat model (ms)':>16} {'trace+panggilan pertama (ms)':>29}")
+    for source, label in sources:
+        runs = []
+        # Run pertama varian artifact membuat artifact bila belum ada; tidak dihitung
+        for i in range(args.repeats + (source == "artifact" and not os.path.exists(artifact))):
+            out = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "startup-probe", "--source", source],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True,
+            ).stdout
+            runs.append([float(v) for v in out.strip().splitlines()[-1].split()])
+        runs = np.array(runs[-args.repeats:])
+        imported, loaded, ready = np.median(runs, axis=0)
+        print(f"{label:<26} {imported:>14.2f} {loaded * 1000:>16.1f} {ready * 1000:>29.1f}")
+
+
+def _synthetic_corpus(folder):
+    # Korpus campuran: foto kecil hingga 24 MP (JPEG) ditambah satu PNG
+    from PIL import Image
+
+    sizes = [(640, 480), (1920, 1080), (4000, 3000), (6000, 4000)]
+    rng = np.random.default_rng(0)
+    paths = []
+    for i, (w, h) in enumerate(sizes):
+        small = rng.integers(0, 256, (h // 16, w // 16, 3), dtype=np.uint8)
+        img = Image.fromarray(small).resize((w, h), Image.Resampling.BILINEAR)
+        path = os.path.join(folder, f"sintetis_{i}.jpg")
+        img.save(path, quality=90)
+        paths.append(path)
+    img.resize((2000, 1500)).save(os.path.join(folder, "sintetis.png"))
+    paths.append(os.path.join(folder, "sintetis.png"))
+    return paths
+
+
+def bench_decode(args):
+    from PIL import Image
+
+    from imaging import MODEL_INPUT_SIZE, REDUCING_GAP, list_images, load_for_model
+
+    def full_decode(path):
+        return Image.open(path).convert("RGB").resize(MODEL_INPUT_SIZE)
+
+    def decoded_pixels(path, draft):
+        img = Image.open(path)
+        if draft:
+            img.draft("RGB", (int(MODEL_INPUT_SIZE[0] * REDUCING_GAP), int(MODEL_INPUT_SIZE[1] * REDUCING_GAP)))
+        return img.size[0] * img.size[1]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = list_images(args.dir) if args.dir else _synthetic_corpus(tmp)
+        print(f"{'gambar':<24} {'ukuran':>11} {'penuh (ms)':>11} {'draft (ms)':>11} {'MP penuh':>9} {'MP draft':>9}")
+        totals = [0.0, 0.0]
+        for path in paths:
+            size = Image.open(path).size
+            full_ms = _latency_ms(full_decode, path, args.repeats)
+            fast_ms = _latency_ms(load_for_model, path, args.repeats)
+            totals[0] += full_ms
+            totals[1] += fast_ms
+            print(f"{os.path.basename(path)[:24]:<24} {size[0]:>5}x{size[1]:<5} {full_ms:>11.1f} {fast_ms:>11.1f} "
+                  f"{decoded_pixels(path, False) / 1e6:>9.2f} {decoded_pixels(path, True) / 1e6:>9.2f}")
+        print(f"Total: penuh {totals[0]:.1f} ms, draft {totals[1]:.1f} ms ({totals[0] / totals[1]:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inferensi restorasi citra")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("batching", help="Throughput micro-batching vs predict langsung")
+    p.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32, 64])
+    p.add_argument("--requests", type=int, default=20, help="Request per klien")
+    p.add_argument("--max-batch-size", type=int, default=32)
+    p.add_argument("--max-wait-ms", type=float, default=5.0)
+    p.set_defaults(func=bench_batching)
+
+    p = sub.add_parser("latency", help="Latensi per panggilan model.predict vs tf.function")
+    p.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32])
+    p.add_argument("--repeats", type=int, default=20)
+    p.add_argument("--xla", action="store_true", help="Sertakan varian XLA")
+    p.add_argument("--backends", nargs="*", default=[], choices=["numpy", "tflite"],
+                   help="Backend tambahan yang ikut diukur")
+    p.set_defaults(func=bench_latency)
+
+    p = sub.add_parser("threads", help="Sweep thread intra/inter-op dan rekomendasi setelan")
+    p.add_argument("--backend", default=os.environ.get("RESTORE_BACKEND", "tf"),
+                   choices=["tf", "numpy", "tflite", "int8"])
+    p.add_argument("--intra", type=int, nargs="*", default=None,
+                   help="Kandidat thread intra-op (default: pangkat dua hingga jumlah CPU)")
+    p.add_argument("--inter", type=int, nargs="+", default=[1, 2])
+    p.add_argument("--batch-size", type=int, default=16)
+    p.add_argument("--duration", type=float, default=5.0, help="Detik per pengukuran")
+    p.set_defaults(func=bench_threads)
+
+    p = sub.add_parser("decode", help="Decode penuh + resize vs decode skala kecil (draft/reduce)")
+    p.add_argument("--dir", default=None, help="Folder korpus (default: korpus sintetis)")
+    p.add_argument("--repeats", type=int, default=5)
+    p.set_defaults(func=bench_decode)
+
+    p = sub.add_parser("startup", help="Waktu muat model: .h5 vs artifact inferensi")
+    p.add_argument("--repeats", type=int, default=3, help="Proses baru per varian (median)")
+    p.set_defaults(func=bench_startup)
+
+    p = sub.add_parser("startup-probe")
+    p.add_argument("--source", choices=["h5", "h5-nocompile", "artifact"], required=True)
+    p.set_defaults(func=bench_startup_probe)
+
+    p = sub.add_parser("threads-probe")
+    p.add_argument("--intra", type=int, required=True)
+    p.add_argument("--inter", type=int, required=True)
+    p.add_argument("--cpus", default="")
+    p.add_argument("--batch-size", type=int, default=16)
+    p.add_argument("--duration", type=float, default=5.0)
+    p.set_defaults(func=bench_threads_probe)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# === Cache Hasil Restorasi ===
+# Hasil di-cache berdasarkan isi: hash byte upload, hash file model dan opsi
+# keluaran. Tier memori berupa LRU dengan anggaran byte; tier disk opsional
+# (bisa dipakai bersama oleh semua worker serve.py) dengan masa berlaku TTL.
+CACHE_MEMORY_MB = int(os.environ.get("RESTORE_CACHE_MB", "256"))
+CACHE_DIR = os.environ.get("RESTORE_CACHE_DIR", "")
+CACHE_TTL_S = int(os.environ.get("RESTORE_CACHE_TTL_S", str(7 * 24 * 3600)))
+# Penyapuan file kedaluwarsa di tier disk paling sering sekali per interval ini
+SWEEP_INTERVAL_S = 600
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def stream_digest(fp):
+    # SHA-256 isi file-like dari posisi awal; posisi dikembalikan ke awal
+    digest = hashlib.sha256()
+    fp.seek(0)
+    for chunk in iter(lambda: fp.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    fp.seek(0)
+    return digest.hexdigest()
+
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return stream_digest(f)
+
+
+def cache_key(upload_digest, model_key, mode, fmt, options):
+    payload = json.dumps([upload_digest, model_key, mode, fmt, options], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ResultCache:
+    """Cache dua tier untuk hasil restorasi (byte hasil encode, format).
+
+    `get()` mengembalikan None bila tidak ada; hit di tier disk dinaikkan ke
+    tier memori. Penghitung hit/miss tersedia lewat `stats()`.
+    """
+
+    def __init__(self, memory_bytes=CACHE_MEMORY_MB * 1024 * 1024, disk_dir=CACHE_DIR, ttl=CACHE_TTL_S):
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir or None
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.memory_bytes > 0 or self.disk_dir is not None
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return value
+        value = self._disk_get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._memory_put(key, value)
+        return value
+
+    def put(self, key, data, fmt):
+        value = (data, fmt)
+        self._memory_put(key, value)
+        self._disk_put(key, value)
+
+    def _memory_put(self, key, value):
+        size = len(value[0])
+        if size > self.memory_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[0])
+            self._entries[key] = value
+            self._size += size
+            while self._size > self.memory_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted[0])
+                self.evictions += 1
+
+    def _path(self, key):
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                fmt, _, data = f.read().partition(b"\n")
+        except OSError:
+            return None
+        return data, fmt.decode()
+
+    def _disk_put(self, key, value):
+        if not self.disk_dir:
+            return
+        data, fmt = value
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(fmt.encode() + b"\n")
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠️ Gagal menulis cache disk: {e}")
+        if time.monotonic() - self._last_sweep > SWEEP_INTERVAL_S:
+            self._last_sweep = time.monotonic()
+            threading.Thread(target=self.sweep, daemon=True).start()
+
+    def sweep(self):
+        # Hapus entri disk yang melewati TTL; mengembalikan jumlah yang dihapus
+        removed = 0
+        cutoff = time.time() - self.ttl
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._entries),
+                "memory_bytes": self._size,
+                "memory_budget_bytes": self.memory_bytes,
+                "disk_dir": self.disk_dir,
+                "disk_ttl_s": self.ttl,
+            }
@@ -0,0 +1,86 @@
+import time
+from io import BytesIO
+
+# === Encoder Keluaran ===
+# Format keluaran dan opsinya dipilih per request, supaya ukuran file bisa
+# ditukar dengan biaya CPU encode:
+#   jpeg: quality (1-95), subsampling (4:4:4 / 4:2:2 / 4:2:0), progressive
+#   webp: quality (0-100), lossless, method (0 = cepat .. 6 = paling kecil)
+#   png:  compress_level (0 = cepat .. 9 = paling kecil)
+#   gif, tiff: tanpa opsi (terutama untuk hasil multi-frame, lihat frames.py)
+
+FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg", ".jpg"),
+    "webp": ("WEBP", "image/webp", ".webp"),
+    "png": ("PNG", "image/png", ".png"),
+    "gif": ("GIF", "image/gif", ".gif"),
+    "tiff": ("TIFF", "image/tiff", ".tif"),
+}
+FORMAT_ALIASES = {"jpg": "jpeg", "tif": "tiff"}
+SUBSAMPLING = {"4:4:4": 0, "4:2:2": 1, "4:2:0": 2}
+DEFAULT_FORMAT = "jpeg"
+
+
+def _flag(value):
+    return str(value).lower() in ("1", "true", "yes", "on")
+
+
+def _int_in(name, value, lo, hi):
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"{name} harus bilangan bulat") from None
+    if not lo <= number <= hi:
+        raise ValueError(f"{name} harus di antara {lo} dan {hi}")
+    return number
+
+
+def parse_options(params, default_format=DEFAULT_FORMAT):
+    """Baca format dan opsi encoder dari mapping parameter (form/query/CLI).
+
+    Mengembalikan (format, opsi) dengan opsi yang sudah dinormalisasi, sehingga
+    hasilnya juga bisa dipakai sebagai bagian kunci cache. Nilai yang tidak valid
+    menimbulkan ValueError.
+    """
+    fmt = str(params.get("format") or default_format).lower()
+    fmt = FORMAT_ALIASES.get(fmt, fmt)
+    if fmt not in FORMATS:
+        raise ValueError(f"Format tidak dikenal: {fmt} (pilih {', '.join(FORMATS)})")
+
+    options = {}
+    if fmt == "jpeg":
+        if params.get("quality") is not None:
+            options["quality"] = _int_in("quality", params["quality"], 1, 95)
+        if params.get("subsampling") is not None:
+            if params["subsampling"] not in SUBSAMPLING:
+                raise ValueError(f"subsampling harus salah satu dari {', '.join(SUBSAMPLING)}")
+            options["subsampling"] = SUBSAMPLING[params["subsampling"]]
+        if params.get("progressive") is not None:
+            options["progressive"] = _flag(params["progressive"])
+    elif fmt == "webp":
+        if params.get("lossless") is not None:
+            options["lossless"] = _flag(params["lossless"])
+        if params.get("quality") is not None:
+            options["quality"] = _int_in("quality", params["quality"], 0, 100)
+        if params.get("method") is not None:
+            options["method"] = _int_in("method", params["method"], 0, 6)
+    elif fmt == "png":
+        if params.get("compress_level") is not None:
+            options["compress_level"] = _int_in("compress_level", params["compress_level"], 0, 9)
+    return fmt, options
+
+
+def mimetype(fmt):
+    return FORMATS[fmt][1]
+
+
+def extension(fmt):
+    return FORMATS[fmt][2]
+
+
+def encode(img, fmt=DEFAULT_FORMAT, options=None):
+    # Mengembalikan (byte hasil encode, waktu encode dalam ms)
+    buffer = BytesIO()
+    start = time.perf_counter()
+    img.save(buffer, format=FORMATS[fmt][0], **(options or {}))
+    return buffer.getvalue(), (time.perf_counter() - start) * 1000
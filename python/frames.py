@@ -0,0 +1,170 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import GifImagePlugin, ImageSequence, TiffImagePlugin
+
+from uploads import MAX_PIXELS, TooManyPixels
+
+# === Gambar Multi-frame ===
+# GIF/APNG/WebP animasi dan TIFF multi-halaman direstorasi per frame. Frame
+# didecode saat dibutuhkan dan diproses per kelompok FRAME_BATCH_SIZE secara
+# bersamaan (tile-nya bisa digabung micro-batcher), lalu langsung di-encode.
+FRAME_BATCH_SIZE = int(os.environ.get("RESTORE_FRAME_BATCH_SIZE", "8"))
+MAX_FRAMES = int(os.environ.get("RESTORE_MAX_FRAMES", "1000"))
+# Batas total piksel seluruh frame (jumlah frame x lebar x tinggi). Hasil APNG
+# dan WebP ditahan di memori sampai semua frame selesai, jadi tanpa batas ini
+# animasi kecil dengan banyak frame besar melewati anggaran MAX_PIXELS.
+MAX_TOTAL_PIXELS = int(os.environ.get("RESTORE_MAX_FRAME_PIXELS", str(MAX_PIXELS)))
+
+# Format sumber yang diperlakukan sebagai multi-frame -> format keluaran.
+# MPO (JPEG kamera dengan gambar pratinjau) sengaja tidak termasuk.
+SOURCE_FORMATS = {"GIF": "gif", "PNG": "png", "WEBP": "webp", "TIFF": "tiff"}
+# Format keluaran yang bisa menyimpan banyak frame
+MULTIFRAME_FORMATS = {"gif", "png", "webp", "tiff"}
+
+
+def is_multiframe(img):
+    return img.format in SOURCE_FORMATS and getattr(img, "is_animated", False)
+
+
+def frame_sizes(img):
+    # Ukuran setiap frame dari header saja. GIF/APNG/WebP memakai ukuran kanvas
+    # untuk semua frame; ukuran tiap halaman TIFF bisa berbeda sehingga IFD-nya
+    # dibaca satu per satu.
+    n_frames = getattr(img, "n_frames", 1)
+    if img.format != "TIFF":
+        return [img.size] * n_frames
+    sizes = []
+    for index in range(n_frames):
+        img.seek(index)
+        sizes.append(img.size)
+    img.seek(0)
+    return sizes
+
+
+def output_format(img, fmt):
+    # Format yang diminta dipakai bila mendukung banyak frame; selain itu
+    # (mis. JPEG) hasil mengikuti format sumber. GIF/APNG/WebP hanya punya satu
+    # ukuran kanvas, jadi TIFF yang ukuran halamannya berbeda tetap menjadi TIFF
+    # agar struktur halamannya terjaga.
+    if fmt not in MULTIFRAME_FORMATS:
+        return SOURCE_FORMATS[img.format]
+    if (img.format == "TIFF" and fmt != "tiff" and getattr(img, "n_frames", 1) <= MAX_FRAMES
+            and len(set(frame_sizes(img))) > 1):
+        return "tiff"
+    return fmt
+
+
+def check_frames(img, max_pixels=MAX_PIXELS, max_frames=MAX_FRAMES, max_total_pixels=MAX_TOTAL_PIXELS):
+    # Periksa jumlah frame dan ukurannya dari header saja, sebelum ada frame
+    # yang didecode
+    n_frames = getattr(img, "n_frames", 1)
+    if n_frames > max_frames:
+        raise TooManyPixels(f"Jumlah frame {n_frames} melebihi batas {max_frames}")
+    sizes = frame_sizes(img)
+    for index, (width, height) in enumerate(sizes):
+        if width * height > max_pixels:
+            raise TooManyPixels(
+                f"Frame {index}: resolusi {width}x{height} melebihi batas {max_pixels / 1e6:.0f} megapiksel"
+            )
+    total = sum(width * height for width, height in sizes)
+    if total > max_total_pixels:
+        raise TooManyPixels(
+            f"Total {n_frames} frame ({total / 1e6:.0f} megapiksel) melebihi batas "
+            f"{max_total_pixels / 1e6:.0f} megapiksel"
+        )
+
+
+def iter_frames(img, max_pixels=MAX_PIXELS, max_frames=MAX_FRAMES):
+    # Hasilkan (frame RGB, durasi ms atau None) satu per satu setelah
+    # check_frames; ukuran frame tetap diperiksa ulang saat didecode
+    check_frames(img, max_pixels, max_frames)
+    for index, frame in enumerate(ImageSequence.Iterator(img)):
+        if index >= max_frames:
+            raise TooManyPixels(f"Jumlah frame melebihi batas {max_frames}")
+        width, height = frame.size
+        if width * height > max_pixels:
+            raise TooManyPixels(
+                f"Frame {index}: resolusi {width}x{height} melebihi batas {max_pixels / 1e6:.0f} megapiksel"
+            )
+        # Durasi WebP baru terisi setelah frame didecode
+        rgb = frame.convert("RGB")
+        yield rgb, frame.info.get("duration")
+
+
+def restore_frames(img, restore_fn, batch_size=FRAME_BATCH_SIZE):
+    """Restorasi semua frame `img` dengan `restore_fn(frame) -> frame`.
+
+    Paling banyak `batch_size` frame didecode dan direstorasi bersamaan, jadi
+    memori tidak bergantung pada jumlah frame. Urutan dan durasi dipertahankan.
+    """
+    frames = iter_frames(img)
+    with ThreadPoolExecutor(max_workers=batch_size) as pool:
+        while True:
+            chunk = [item for _, item in zip(range(batch_size), frames)]
+            if not chunk:
+                break
+            restored = pool.map(restore_fn, [frame for frame, _ in chunk])
+            for out, (_, duration) in zip(restored, chunk):
+                yield out, duration
+
+
+def _write_gif(fp, frames, loop):
+    # Ditulis per frame dengan palet lokal masing-masing; writer save_all
+    # Pillow menahan semua frame sebelum menulis
+    encode_ms = 0.0
+    for index, (frame, duration) in enumerate(frames):
+        start = time.perf_counter()
+        frame = frame.quantize()
+        if index == 0:
+            info = {} if loop is None else {"loop": loop}
+            header, _ = GifImagePlugin.getheader(frame, info=info)
+            fp.write(b"".join(header))
+        params = {"include_color_table": True}
+        if duration:
+            params["duration"] = duration
+        fp.write(b"".join(GifImagePlugin.getdata(frame, **params)))
+        encode_ms += (time.perf_counter() - start) * 1000
+    fp.write(b";")
+    return encode_ms
+
+
+def _write_tiff(fp, frames, options):
+    encode_ms = 0.0
+    with TiffImagePlugin.AppendingTiffWriter(fp) as tiff:
+        for frame, _ in frames:
+            start = time.perf_counter()
+            frame.save(tiff, format="TIFF", **options)
+            tiff.newFrame()
+            encode_ms += (time.perf_counter() - start) * 1000
+    return encode_ms
+
+
+def encode_frames(frames, fmt, options=None, loop=None):
+    """Encode iterable (frame, durasi) menjadi satu file multi-frame.
+
+    GIF dan TIFF ditulis per frame saat frame selesai direstorasi. Writer
+    APNG dan WebP di Pillow membutuhkan semua frame sekaligus, sehingga frame
+    hasil restorasi dikumpulkan dulu untuk kedua format itu. Mengembalikan
+    (byte hasil, waktu encode dalam ms).
+    """
+    options = dict(options or {})
+    buffer = BytesIO()
+    if fmt == "gif":
+        encode_ms = _write_gif(buffer, frames, loop)
+    elif fmt == "tiff":
+        encode_ms = _write_tiff(buffer, frames, options)
+    else:
+        images, durations = [], []
+        for frame, duration in frames:
+            images.append(frame)
+            durations.append(duration or 0)
+        if loop is not None:
+            options["loop"] = loop
+        start = time.perf_counter()
+        images[0].save(buffer, format=fmt.upper(), save_all=True, append_images=images[1:],
+                       duration=durations, **options)
+        encode_ms = (time.perf_counter() - start) * 1000
+    return buffer.getvalue(), encode_ms
@@ -0,0 +1,35 @@
+import os
+
+from PIL import Image
+
+# === Decode Gambar untuk Input Model ===
+MODEL_INPUT_SIZE = (128, 128)
+# Sumber minimal diperkecil hingga REDUCING_GAP x ukuran target sebelum resize
+# akhir, supaya kualitas antialiasing tetap terjaga
+REDUCING_GAP = 2.0
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+
+
+def list_images(folder):
+    paths = []
+    for root, _, files in os.walk(folder):
+        paths += [os.path.join(root, f) for f in sorted(files) if f.lower().endswith(IMAGE_EXTENSIONS)]
+    return paths
+
+
+def load_for_model(fp, size=MODEL_INPUT_SIZE):
+    """Buka gambar (file atau Image yang belum didecode) dan kecilkan ke
+    `size` tanpa decode resolusi penuh.
+
+    JPEG didecode langsung pada skala 1/2, 1/4 atau 1/8 di domain DCT (draft
+    mode), sedangkan format lain diperkecil dengan `reduce()` (box filter
+    bilangan bulat) sebelum resize akhir. Untuk foto 24 MP, waktu decode dan
+    memori puncak turun hingga 64x.
+    """
+    img = fp if isinstance(fp, Image.Image) else Image.open(fp)
+    img.draft("RGB", (int(size[0] * REDUCING_GAP), int(size[1] * REDUCING_GAP)))
+    img = img.convert("RGB")
+    if img.size == tuple(size):
+        return img
+    return img.resize(size, reducing_gap=REDUCING_GAP)
@@ -0,0 +1,317 @@
+import os
+import time
+
+import numpy as np
+
+# === Konfigurasi Inferensi ===
+INPUT_SHAPE = (128, 128, 3)
+# Aktifkan kompilasi XLA dengan RESTORE_XLA=1
+USE_XLA = os.environ.get("RESTORE_XLA", "0") == "1"
+# Backend inferensi: "tf" (TensorFlow), "numpy" (tanpa TensorFlow),
+# "tflite" (interpreter TFLite + XNNPACK) atau "int8" (TFLite terkuantisasi)
+BACKEND = os.environ.get("RESTORE_BACKEND", "tf")
+# Presisi komputasi backend "tf": "float32", "bfloat16" atau "float16".
+# Aktivasi antar layer ikut disimpan dalam presisi setengah.
+PRECISION = os.environ.get("RESTORE_PRECISION", "float32")
+# Antarmuka piksel: predictor menerima dan mengembalikan uint8 0..255, dengan
+# normalisasi /255 serta pembulatan dan clipping hasil di dalam graph.
+# RESTORE_UINT8_IO=0 kembali ke batch float32 0..1.
+UINT8_IO = os.environ.get("RESTORE_UINT8_IO", "1") == "1"
+# Folder artifact inferensi backend "tf" (default: model/.cache di samping .h5)
+ARTIFACT_DIR = os.environ.get("RESTORE_ARTIFACT_DIR", "")
+
+# Thread intra-op / inter-op dan daftar CPU ("0-3,6"); 0/kosong = bawaan backend
+INTRA_OP_THREADS = int(os.environ.get("RESTORE_INTRA_OP_THREADS", "0"))
+INTER_OP_THREADS = int(os.environ.get("RESTORE_INTER_OP_THREADS", "0"))
+CPU_AFFINITY = os.environ.get("RESTORE_CPU_AFFINITY", "")
+_threads_configured = False
+
+# Flag CPU (Linux /proc/cpuinfo) yang menandakan dukungan hardware
+PRECISION_CPU_FLAGS = {
+    "bfloat16": ("avx512_bf16", "amx_bf16"),
+    "float16": ("avx512_fp16", "amx_fp16"),
+}
+
+
+class CompiledModel:
+    """Pembungkus inferensi berbasis tf.function dengan signature tetap.
+
+    Berbeda dengan `model.predict`, yang membangun data adapter, step function
+    dan callback progres di setiap panggilan, graph di sini di-trace sekali saat
+    model dimuat lalu dipakai ulang untuk semua request.
+
+    Dengan `uint8_io`, graph menerima piksel uint8 dan mengembalikan uint8 yang
+    sudah dibulatkan dan di-clip, sehingga host tidak membuat salinan float
+    seukuran gambar dan data yang melintasi batas Python/TF hanya 1 byte per
+    kanal.
+    """
+
+    def __init__(self, model, jit_compile=USE_XLA, uint8_io=UINT8_IO):
+        import tensorflow as tf
+
+        self.model = model
+        self.jit_compile = jit_compile
+        self.uint8_io = uint8_io
+        self.dtype = np.uint8 if uint8_io else np.float32
+
+        def serve(x):
+            if uint8_io:
+                x = tf.cast(x, tf.float32) * (1.0 / 255.0)
+            y = tf.cast(model(x, training=False), tf.float32)
+            if uint8_io:
+                y = tf.cast(tf.clip_by_value(tf.round(y * 255.0), 0.0, 255.0), tf.uint8)
+            return y
+
+        self._fn = tf.function(
+            serve,
+            input_signature=[tf.TensorSpec((None,) + INPUT_SHAPE, tf.as_dtype(self.dtype))],
+            jit_compile=jit_compile,
+        ).get_concrete_function()
+
+    def __call__(self, batch):
+        batch = np.asarray(batch, dtype=self.dtype)
+        return self._fn(batch).numpy()
+
+
+class PixelModel:
+    """Antarmuka piksel uint8 untuk predictor float32 (NumPy, TFLite).
+
+    Normalisasi dan pembulatan dilakukan dalam float32 dengan satu salinan
+    per arah, bukan lewat array float64 perantara.
+    """
+
+    dtype = np.uint8
+    uint8_io = True
+
+    def __init__(self, predictor):
+        self.predictor = predictor
+
+    def __call__(self, batch):
+        x = np.multiply(batch, np.float32(1.0 / 255.0), dtype=np.float32)
+        return to_pixels(self.predictor(x))
+
+
+def to_pixels(x):
+    # Keluaran float 0..1 -> uint8 dengan pembulatan ke terdekat; pemotongan
+    # (astype langsung) menggeser hasil rata-rata setengah level lebih gelap
+    y = np.multiply(x, np.float32(255.0), dtype=np.float32)
+    np.rint(y, out=y)
+    np.clip(y, 0, 255, out=y)
+    return y.astype(np.uint8)
+
+
+def warm_up(predictor, batch_sizes, repeats=2):
+    # Jalankan batch sintetis di setiap ukuran batch yang akan dipakai server
+    # agar tracing graph dan pemilihan kernel tidak dibayar oleh request pertama
+    dtype = np.uint8 if getattr(predictor, "uint8_io", False) else np.float32
+    start = time.perf_counter()
+    for size in sorted(set(batch_sizes)):
+        batch = np.zeros((size,) + INPUT_SHAPE, dtype=dtype)
+        for _ in range(repeats):
+            predictor(batch)
+    return time.perf_counter() - start
+
+
+def parse_cpu_list(spec):
+    # "0-3,6" -> {0, 1, 2, 3, 6}
+    cpus = set()
+    for part in spec.split(","):
+        if "-" in part:
+            lo, hi = part.split("-")
+            cpus.update(range(int(lo), int(hi) + 1))
+        elif part.strip():
+            cpus.add(int(part))
+    return cpus
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+# Fungsi pengatur thread di library BLAS yang sudah dimuat numpy. Variabel
+# lingkungan OPENBLAS_NUM_THREADS dsb. hanya dibaca saat library dimuat, yaitu
+# saat `import numpy`, jadi batas untuk proses yang sedang berjalan diset lewat
+# fungsi ini. Build numpy dari PyPI memakai OpenBLAS dengan prefix scipy_.
+BLAS_THREAD_SETTERS = (
+    "openblas_set_num_threads",
+    "openblas_set_num_threads64_",
+    "scipy_openblas_set_num_threads",
+    "scipy_openblas_set_num_threads64_",
+    "MKL_Set_Num_Threads",
+)
+
+
+def limit_blas_threads(n):
+    # Kembalikan jumlah library BLAS yang berhasil dibatasi (Linux: dicari
+    # lewat /proc/self/maps)
+    import ctypes
+
+    try:
+        with open("/proc/self/maps") as f:
+            paths = {line.split()[-1] for line in f if ".so" in line}
+    except OSError:
+        return 0
+    limited = 0
+    for path in sorted(paths):
+        name = os.path.basename(path).lower()
+        if "blas" not in name and "mkl_rt" not in name:
+            continue
+        try:
+            lib = ctypes.CDLL(path)
+        except OSError:
+            continue
+        for symbol in BLAS_THREAD_SETTERS:
+            setter = getattr(lib, symbol, None)
+            if setter is not None:
+                setter(ctypes.c_int(n))
+                limited += 1
+                break
+    return limited
+
+
+def configure_threads(intra_op=None, inter_op=None, cpus=None):
+    # Batasi jumlah thread per proses agar beberapa worker tidak saling
+    # berebut core, dan (opsional) kunci proses ke sekumpulan CPU.
+    # Harus dipanggil sebelum backend dimuat; panggilan berikutnya diabaikan.
+    global _threads_configured
+    if _threads_configured:
+        return
+    _threads_configured = True
+
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    if intra_op:
+        # Variabel lingkungan untuk library yang dimuat setelah ini dan proses
+        # anak; BLAS numpy yang sudah dimuat dibatasi langsung
+        for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ[var] = str(intra_op)
+        os.environ["RESTORE_TFLITE_THREADS"] = str(intra_op)
+        limit_blas_threads(intra_op)
+    if BACKEND == "tf" and (intra_op or inter_op):
+        import tensorflow as tf
+        if intra_op:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+        if inter_op:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+
+
+def cpu_supports(precision):
+    if precision == "float32":
+        return True
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = set(f.read().split())
+    except OSError:
+        return False
+    return any(flag in flags for flag in PRECISION_CPU_FLAGS.get(precision, ()))
+
+
+def resolve_precision(precision):
+    if precision not in ("float32", "bfloat16", "float16"):
+        raise ValueError(f"Presisi tidak dikenal: {precision}")
+    if not cpu_supports(precision):
+        print(f"⚠️ CPU tidak mendukung {precision}, kembali ke float32")
+        return "float32"
+    return precision
+
+
+def with_precision(model, precision):
+    # Bangun ulang model dengan dtype policy "mixed_<presisi>": bobot tetap
+    # float32, komputasi dan aktivasi memakai presisi setengah
+    import tensorflow as tf
+
+    if precision == "float32":
+        return model
+    config = model.get_config()
+    for layer in config["layers"]:
+        if layer["class_name"] != "InputLayer":
+            layer["config"]["dtype"] = f"mixed_{precision}"
+    rebuilt = tf.keras.Model.from_config(config)
+    rebuilt.set_weights(model.get_weights())
+    return rebuilt
+
+
+def artifact_path(path, artifact_dir=ARTIFACT_DIR):
+    # Kunci artifact adalah hash isi .h5, sehingga model yang diganti otomatis
+    # dikonversi ulang
+    from cache import file_digest
+
+    folder = artifact_dir or os.path.join(os.path.dirname(os.path.abspath(path)), ".cache")
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(folder, f"{stem}-{file_digest(path)[:16]}.npz")
+
+
+def save_artifact(model, artifact):
+    folder = os.path.dirname(artifact)
+    os.makedirs(folder, exist_ok=True)
+    # File sementara diawali titik dan tidak berakhiran .npz, sehingga tidak
+    # ikut terhapus pembersihan di bawah oleh worker lain yang menyimpan
+    # artifact bersamaan
+    tmp = os.path.join(folder, f".{os.path.basename(artifact)}.{os.getpid()}.tmp")
+    weights = {f"w{i}": w for i, w in enumerate(model.get_weights())}
+    with open(tmp, "wb") as f:
+        np.savez(f, config=np.array(model.to_json()), **weights)
+    os.replace(tmp, artifact)
+    # Artifact dari versi .h5 sebelumnya tidak akan terpakai lagi
+    stem = os.path.basename(artifact).rsplit("-", 1)[0]
+    for name in os.listdir(folder):
+        if name.startswith(stem + "-") and name.endswith(".npz") and name != os.path.basename(artifact):
+            try:
+                os.remove(os.path.join(folder, name))
+            except FileNotFoundError:
+                pass  # sudah dihapus worker lain
+
+
+def load_keras_model(path, use_artifact=True):
+    """Muat model Keras khusus inferensi.
+
+    `load_model` pada .h5 mem-parsing HDF5, membangun ulang layer lalu
+    memulihkan state optimizer Adam. Pada start pertama model dimuat dengan
+    `compile=False` lalu arsitektur (JSON) dan bobotnya disimpan sebagai .npz;
+    start berikutnya hanya membangun layer dari JSON dan mengisi bobot.
+    """
+    import tensorflow as tf
+
+    if not use_artifact:
+        return tf.keras.models.load_model(path, compile=False)
+    artifact = artifact_path(path)
+    if os.path.exists(artifact):
+        with np.load(artifact) as data:
+            model = tf.keras.models.model_from_json(str(data["config"]))
+            model.set_weights([data[f"w{i}"] for i in range(len(data.files) - 1)])
+        return model
+
+    model = tf.keras.models.load_model(path, compile=False)
+    try:
+        save_artifact(model, artifact)
+        print(f"ℹ️ Artifact inferensi disimpan di {artifact}")
+    except OSError as e:
+        print(f"⚠️ Gagal menyimpan artifact inferensi: {e}")
+    return model
+
+
+def load_predictor(path, backend=BACKEND, jit_compile=USE_XLA, precision=PRECISION,
+                   uint8_io=UINT8_IO):
+    configure_threads(INTRA_OP_THREADS, INTER_OP_THREADS, parse_cpu_list(CPU_AFFINITY))
+    # TensorFlow hanya diimpor bila backend "tf" dipakai
+    if backend != "tf" and precision != "float32":
+        print(f"⚠️ Presisi {precision} hanya berlaku untuk backend tf, memakai float32")
+    if backend == "numpy":
+        from numpy_backend import NumpyModel
+        model = NumpyModel.from_h5(path)
+        return PixelModel(model) if uint8_io else model
+    if backend == "tflite":
+        from tflite_backend import load_tflite
+        model = load_tflite(path)
+        return PixelModel(model) if uint8_io else model
+    if backend == "int8":
+        from tflite_backend import load_int8
+        return load_int8(path)
+    if backend != "tf":
+        raise ValueError(f"Backend tidak dikenal: {backend}")
+
+    model = load_keras_model(path)
+    model = with_precision(model, resolve_precision(precision))
+    return CompiledModel(model, jit_compile=jit_compile, uint8_io=uint8_io)
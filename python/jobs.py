@@ -0,0 +1,207 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# === Job Restorasi Asinkron ===
+# POST /jobs langsung mengembalikan id; pekerjaan dijalankan di pool worker
+# berukuran tetap dan hasilnya disimpan sampai TTL habis. Dengan
+# RESTORE_JOB_DIR status dan hasil ditulis ke disk, sehingga semua worker
+# serve.py bisa menjawab polling untuk job yang dibuat worker lain.
+JOB_WORKERS = int(os.environ.get("RESTORE_JOB_WORKERS", "2"))
+# Job yang boleh menunggu di antrean; di atas itu POST /jobs dijawab 503
+JOB_MAX_QUEUED = int(os.environ.get("RESTORE_JOB_MAX_QUEUED", "64"))
+JOB_TTL_S = int(os.environ.get("RESTORE_JOB_TTL_S", "3600"))
+# Anggaran memori untuk hasil yang belum diambil (tanpa RESTORE_JOB_DIR)
+JOB_MEMORY_MB = int(os.environ.get("RESTORE_JOB_MEMORY_MB", "512"))
+JOB_DIR = os.environ.get("RESTORE_JOB_DIR", "")
+SWEEP_INTERVAL_S = 60
+
+JOB_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+class JobStore:
+    """Antrean job dengan pool worker terbatas dan penyimpanan hasil ber-TTL.
+
+    `submit(fn)` menjadwalkan `fn() -> (byte hasil, format, info)` dan
+    mengembalikan id job. `status()` mengembalikan dict status atau None bila
+    job tidak dikenal atau sudah kedaluwarsa; `result()` mengembalikan
+    (byte hasil atau path file, format) untuk job yang selesai.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_queued=JOB_MAX_QUEUED, ttl=JOB_TTL_S,
+                 memory_bytes=JOB_MEMORY_MB * 1024 * 1024, job_dir=JOB_DIR):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self.memory_bytes = memory_bytes
+        self.job_dir = job_dir or None
+        self._jobs = OrderedDict()
+        self._results = {}
+        self._size = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._pool = None
+        self._pool_pid = None
+        if self.job_dir:
+            os.makedirs(self.job_dir, exist_ok=True)
+
+    def _executor(self):
+        # Seperti micro-batcher, thread pool tidak ikut tersalin saat fork
+        if self._pool is None or self._pool_pid != os.getpid():
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="restore-job")
+            self._pool_pid = os.getpid()
+        return self._pool
+
+    def submit(self, fn):
+        self.sweep()
+        with self._lock:
+            if self._active >= self.workers + self.max_queued:
+                raise QueueFull(f"Antrean job penuh ({self._active} job aktif)")
+            self._active += 1
+            job_id = uuid.uuid4().hex
+            job = {"id": job_id, "status": QUEUED, "created": time.time()}
+            self._jobs[job_id] = job
+            executor = self._executor()
+        self._save(job)
+        executor.submit(self._run, job, fn)
+        return job_id
+
+    def _run(self, job, fn):
+        self._update(job, status=RUNNING, started=time.time())
+        try:
+            data, fmt, info = fn()
+            # Gagal menyimpan hasil (disk penuh, izin) juga menandai job gagal,
+            # bukan membiarkannya "running" selamanya
+            self._store_result(job["id"], data)
+        except Exception as e:
+            self._update(job, status=FAILED, finished=time.time(), error=str(e), error_type=type(e).__name__)
+            return
+        finally:
+            with self._lock:
+                self._active -= 1
+        self._update(job, status=DONE, finished=time.time(), format=fmt, bytes=len(data), **info)
+
+    def _update(self, job, **fields):
+        with self._lock:
+            job.update(fields)
+            snapshot = dict(job)
+        self._save(snapshot)
+
+    def _path(self, job_id, suffix):
+        return os.path.join(self.job_dir, job_id + suffix)
+
+    def _save(self, job):
+        if not self.job_dir:
+            return
+        path = self._path(job["id"], ".json")
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(job, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"⚠️ Gagal menulis status job: {e}")
+
+    def _store_result(self, job_id, data):
+        if self.job_dir:
+            path = self._path(job_id, ".data")
+            try:
+                with open(path + ".tmp", "wb") as f:
+                    f.write(data)
+                os.replace(path + ".tmp", path)
+            except OSError:
+                if os.path.exists(path + ".tmp"):
+                    os.remove(path + ".tmp")
+                raise
+            return
+        with self._lock:
+            self._results[job_id] = data
+            self._size += len(data)
+            # Hasil tertua yang belum diambil dibuang lebih dulu bila melebihi anggaran
+            for old_id in list(self._jobs):
+                if self._size <= self.memory_bytes:
+                    break
+                if old_id in self._results and old_id != job_id:
+                    self._size -= len(self._results.pop(old_id))
+                    del self._jobs[old_id]
+
+    def status(self, job_id):
+        if not JOB_ID_PATTERN.fullmatch(job_id):
+            return None
+        self.sweep()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        if not self.job_dir:
+            return None
+        try:
+            with open(self._path(job_id, ".json")) as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if job.get("finished") and time.time() - job["finished"] > self.ttl:
+            return None
+        return job
+
+    def result(self, job_id):
+        job = self.status(job_id)
+        if job is None or job["status"] != DONE:
+            return None
+        if self.job_dir:
+            path = self._path(job_id, ".data")
+            return (path, job["format"]) if os.path.exists(path) else None
+        with self._lock:
+            data = self._results.get(job_id)
+        return None if data is None else (data, job["format"])
+
+    def sweep(self):
+        # Buang job yang selesai lebih dari TTL lalu (memori, dan disk paling
+        # sering sekali per SWEEP_INTERVAL_S)
+        now = time.time()
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if job.get("finished") and now - job["finished"] > self.ttl:
+                    del self._jobs[job_id]
+                    data = self._results.pop(job_id, None)
+                    if data is not None:
+                        self._size -= len(data)
+            if not self.job_dir or time.monotonic() - self._last_sweep < SWEEP_INTERVAL_S:
+                return
+            self._last_sweep = time.monotonic()
+        cutoff = now - self.ttl
+        for name in os.listdir(self.job_dir):
+            path = os.path.join(self.job_dir, name)
+            try:
+                # Status job yang masih berjalan diperbarui saat selesai, jadi
+                # mtime-nya tidak pernah jauh tertinggal kecuali job macet
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job["status"]] += 1
+            return {
+                **counts,
+                "active": self._active,
+                "capacity": self.workers + self.max_queued,
+                "result_bytes": self._size,
+                "job_dir": self.job_dir,
+                "ttl_s": self.ttl,
+            }
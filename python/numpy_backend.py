@@ -0,0 +1,80 @@
+import json
+
+import h5py
+import numpy as np
+
+# === Backend NumPy ===
+# Forward pass model restorasi tanpa TensorFlow. Kernel dan bias dibaca
+# langsung dari file .h5 dengan h5py, lalu setiap konvolusi 3x3 dijalankan
+# sebagai GEMM terhadap kolom-kolom im2col dari input yang di-padding.
+
+ACTIVATIONS = {
+    "relu": lambda x: np.maximum(x, 0, out=x),
+    # Bentuk tanh dari sigmoid stabil untuk nilai negatif besar
+    "sigmoid": lambda x: np.multiply(np.tanh(x * 0.5, out=x) + 1, 0.5, out=x),
+    "linear": lambda x: x,
+}
+
+
+def _conv2d_same(x, kernel, bias):
+    # x: [N, H, W, C], kernel: [kh, kw, C, O]; stride 1, padding "same"
+    n, h, w, c = x.shape
+    kh, kw, _, o = kernel.shape
+    py, px = kh // 2, kw // 2
+    padded = np.pad(x, ((0, 0), (py, kh - 1 - py), (px, kw - 1 - px), (0, 0)))
+
+    # im2col per posisi kernel: setiap tap menjadi satu GEMM [N*H*W, C] x [C, O]
+    # sehingga matriks kolom penuh [N*H*W, kh*kw*C] tidak perlu dibentuk sekaligus
+    out = np.empty((n * h * w, o), dtype=np.float32)
+    out[:] = bias
+    for dy in range(kh):
+        for dx in range(kw):
+            cols = padded[:, dy:dy + h, dx:dx + w, :].reshape(-1, c)
+            out += cols @ kernel[dy, dx]
+    return out.reshape(n, h, w, o)
+
+
+def _transpose_kernel(kernel):
+    # Conv2DTranspose stride 1 "same" setara dengan konvolusi biasa memakai
+    # kernel yang dibalik secara spasial dan sumbu in/out yang ditukar.
+    # Kernel Keras untuk Conv2DTranspose berbentuk [kh, kw, out, in].
+    return np.ascontiguousarray(kernel[::-1, ::-1].transpose(0, 1, 3, 2))
+
+
+class NumpyModel:
+    def __init__(self, layers):
+        # layers: list (kernel [kh, kw, C, O], bias [O], nama aktivasi)
+        self.layers = layers
+
+    @classmethod
+    def from_h5(cls, path):
+        layers = []
+        with h5py.File(path, "r") as f:
+            config = json.loads(f.attrs["model_config"])
+            weights = f["model_weights"]
+            for layer in config["config"]["layers"]:
+                kind = layer["class_name"]
+                if kind == "InputLayer":
+                    continue
+                if kind not in ("Conv2D", "Conv2DTranspose"):
+                    raise ValueError(f"Layer {kind} tidak didukung backend NumPy")
+
+                cfg = layer["config"]
+                if tuple(cfg["strides"]) != (1, 1) or cfg["padding"] != "same":
+                    raise ValueError(f"Layer {cfg['name']} harus stride 1 dengan padding 'same'")
+
+                group = weights[cfg["name"]]
+                names = [n.decode() if isinstance(n, bytes) else n for n in group.attrs["weight_names"]]
+                params = {name.split("/")[-1].split(":")[0]: group[name][()] for name in names}
+                kernel = params["kernel"].astype(np.float32)
+                if kind == "Conv2DTranspose":
+                    kernel = _transpose_kernel(kernel)
+                bias = params.get("bias", np.zeros(kernel.shape[-1])).astype(np.float32)
+                layers.append((kernel, bias, cfg["activation"]))
+        return cls(layers)
+
+    def __call__(self, batch):
+        x = np.asarray(batch, dtype=np.float32)
+        for kernel, bias, activation in self.layers:
+            x = ACTIVATIONS[activation](_conv2d_same(x, kernel, bias))
+        return x
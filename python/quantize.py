@@ -0,0 +1,144 @@
+import argparse
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+from imaging import list_images
+from tflite_backend import MODEL_PATH, QuantizedModel, default_int8_path, load_tflite
+
+# === Kuantisasi int8 Pasca-Training ===
+# Kalibrasi memakai kumpulan gambar representatif, lalu menghasilkan model int8
+# penuh dengan input/output uint8 beserta laporan PSNR/SSIM terhadap model
+# float dan perbandingan latensi.
+
+
+def sample_tiles(paths, count, seed=0):
+    # Campuran gambar yang di-resize ke 128x128 (mode cepat) dan potongan
+    # 128x128 pada resolusi asli (mode tiled), sesuai input nyata di server
+    rng = np.random.default_rng(seed)
+    tiles = []
+    while len(tiles) < count and paths:
+        for path in paths:
+            img = Image.open(path).convert("RGB")
+            if len(tiles) % 2 == 0 or min(img.size) < 128:
+                tile = np.array(img.resize((128, 128)))
+            else:
+                x = rng.integers(0, img.width - 127)
+                y = rng.integers(0, img.height - 127)
+                tile = np.array(img.crop((x, y, x + 128, y + 128)))
+            tiles.append(tile)
+            if len(tiles) == count:
+                break
+    return np.stack(tiles)
+
+
+def split_holdout(paths, fraction, seed=0):
+    # Pisahkan sebagian gambar (bukan tile) sebagai set evaluasi, agar drift
+    # tidak diukur pada gambar yang dipakai untuk kalibrasi
+    order = np.random.default_rng(seed).permutation(len(paths))
+    n_eval = max(1, int(round(len(paths) * fraction)))
+    eval_idx = set(order[:n_eval].tolist())
+    calib = [p for i, p in enumerate(paths) if i not in eval_idx]
+    held = [p for i, p in enumerate(paths) if i in eval_idx]
+    return calib, held
+
+
+def quantize(h5_path, calib_tiles, out_path=None):
+    import tensorflow as tf
+
+    out_path = out_path or default_int8_path(h5_path)
+    model = tf.keras.models.load_model(h5_path, compile=False)
+
+    def representative_dataset():
+        # Sampel pertama memuat piksel 0 dan 255 agar rentang input terkalibrasi
+        # tepat [0, 1] dan skala input menjadi 1/255
+        edge = calib_tiles[:1].astype(np.float32) / 255.0
+        edge[0, 0, 0], edge[0, 0, 1] = 0.0, 1.0
+        yield [edge]
+        for tile in calib_tiles:
+            yield [tile[None].astype(np.float32) / 255.0]
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = representative_dataset
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.uint8
+    converter.inference_output_type = tf.uint8
+    with open(out_path, "wb") as f:
+        f.write(converter.convert())
+    return out_path
+
+
+def _latency_ms(fn, batch, repeats=10):
+    fn(batch)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(batch)
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def report(h5_path, int8_path, eval_tiles, batch_size=16):
+    import tensorflow as tf
+
+    float_model = load_tflite(h5_path)
+    int8_model = QuantizedModel(int8_path)
+
+    ref, quant = [], []
+    for i in range(0, len(eval_tiles), batch_size):
+        batch = eval_tiles[i:i + batch_size]
+        ref.append(np.clip(np.rint(float_model(batch / np.float32(255.0)) * 255), 0, 255).astype(np.uint8))
+        quant.append(int8_model(batch))
+    ref, quant = np.concatenate(ref), np.concatenate(quant)
+
+    psnr = tf.image.psnr(ref, quant, max_val=255).numpy()
+    ssim = tf.image.ssim(ref, quant, max_val=255).numpy()
+    print(f"📊 Drift int8 vs float ({len(eval_tiles)} tile):")
+    print(f"   PSNR rata-rata {psnr.mean():.2f} dB (min {psnr.min():.2f} dB)")
+    print(f"   SSIM rata-rata {ssim.mean():.4f} (min {ssim.min():.4f})")
+
+    batch = eval_tiles[:batch_size]
+    float_ms = _latency_ms(lambda b: float_model(b / np.float32(255.0)), batch)
+    int8_ms = _latency_ms(int8_model, batch)
+    print(f"⏱️ Latensi batch {len(batch)}: float {float_ms:.1f} ms, int8 {int8_ms:.1f} ms "
+          f"({float_ms / int8_ms:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kuantisasi int8 model restorasi citra")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--calib-dir", required=True, help="Folder gambar representatif")
+    parser.add_argument("--eval-dir", default=None,
+                        help="Folder gambar evaluasi (default: sebagian gambar calib-dir disisihkan)")
+    parser.add_argument("--eval-fraction", type=float, default=0.2,
+                        help="Porsi gambar calib-dir untuk evaluasi bila --eval-dir tidak diberikan")
+    parser.add_argument("--samples", type=int, default=200, help="Jumlah tile kalibrasi")
+    parser.add_argument("--eval-samples", type=int, default=64)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    calib_paths = list_images(args.calib_dir)
+    if not calib_paths:
+        parser.error(f"Tidak ada gambar di {args.calib_dir}")
+    if args.eval_dir:
+        eval_paths = list_images(args.eval_dir)
+        if not eval_paths:
+            parser.error(f"Tidak ada gambar di {args.eval_dir}")
+    elif len(calib_paths) >= 2:
+        calib_paths, eval_paths = split_holdout(calib_paths, args.eval_fraction)
+        print(f"🔀 {len(eval_paths)} dari {len(calib_paths) + len(eval_paths)} gambar disisihkan untuk evaluasi")
+    else:
+        eval_paths = calib_paths
+    overlap = {os.path.realpath(p) for p in calib_paths} & {os.path.realpath(p) for p in eval_paths}
+    if overlap:
+        print(f"⚠️ {len(overlap)} gambar evaluasi juga dipakai untuk kalibrasi; "
+              "drift PSNR/SSIM kemungkinan terlalu kecil")
+
+    out_path = quantize(args.model, sample_tiles(calib_paths, args.samples), args.output)
+    print("✅ Model int8 disimpan di:", out_path)
+    report(args.model, out_path, sample_tiles(eval_paths, args.eval_samples, seed=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,471 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_cors import CORS
 import numpy as np
 from PIL import Image
-from io import BytesIO
 import base64
-from tensorflow.keras.models import load_model
+import itertools
 import os
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from archive import MAX_BATCH_FILES, ZipStream, is_zip, iter_zip_images, output_name
+from batching import MicroBatcher
+from cache import ResultCache, cache_key, file_digest, stream_digest
+from encoders import encode, extension, mimetype, parse_options
+from frames import encode_frames, is_multiframe, output_format, restore_frames
+from imaging import MODEL_INPUT_SIZE, load_for_model
+from inference import BACKEND, PRECISION, load_predictor, to_pixels, warm_up
+from jobs import DONE, FAILED, JobStore, QueueFull
+from tiling import TileStats, restore_tiled
+from uploads import MAX_UPLOAD_BYTES, TooManyPixels, UploadTooLarge, open_checked, spool_stream
 
 app = Flask(__name__)
 CORS(app)
+# Body yang Content-Length-nya melebihi batas ditolak (413) sebelum dibaca;
+# upload multipart besar di-spool Werkzeug ke file sementara
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(BASE_DIR, "../model/model_restorasi_citra.h5")
 
-# Coba muat model
-try:
-    model = load_model(MODEL_PATH)
-    print("✅ Model berhasil dimuat dari:", MODEL_PATH)
-except Exception as e:
-    print(f"❌ Gagal memuat model: {e}")
-    model = None
+# Mode default: "tiled" (resolusi asli) atau "resize" (128x128)
+MODES = ("tiled", "resize")
+RESTORE_MODE = os.environ.get("RESTORE_MODE", "tiled")
+
+# Micro-batching: request bersamaan digabung menjadi satu batch [N,128,128,3]
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "32"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "5"))
+# Jumlah tile per kiriman ke batcher pada mode tiled
+TILE_BATCH_SIZE = min(BATCH_MAX_SIZE, 16)
+
+# Thread decode/encode paralel untuk /restore/batch
+BATCH_WORKERS = int(os.environ.get("RESTORE_BATCH_WORKERS", "8"))
+
+# Ukuran batch untuk warm-up: pangkat dua hingga BATCH_MAX_SIZE ditambah ukuran
+# yang pasti dipakai (1, TILE_BATCH_SIZE, BATCH_MAX_SIZE). Bisa diganti lewat
+# WARMUP_BATCH_SIZES="1,8,32".
+if os.environ.get("WARMUP_BATCH_SIZES"):
+    WARMUP_BATCH_SIZES = [int(n) for n in os.environ["WARMUP_BATCH_SIZES"].split(",")]
+else:
+    WARMUP_BATCH_SIZES = sorted(
+        {2 ** i for i in range(BATCH_MAX_SIZE.bit_length()) if 2 ** i <= BATCH_MAX_SIZE}
+        | {1, TILE_BATCH_SIZE, BATCH_MAX_SIZE}
+    )
+
+model = None
+# Predictor menerima dan mengembalikan piksel uint8 secara langsung
+# (graph uint8 atau model int8); lihat RESTORE_UINT8_IO di inference.py
+UINT8_IO = False
+
+_batcher = None
+_batcher_pid = None
+_batcher_lock = threading.Lock()
+
+# Diset setelah warm-up selesai; /ready mengembalikan 503 sebelum itu
+ready = threading.Event()
+
+# Cache hasil per isi upload; kunci model berubah bila file model, backend
+# atau presisinya berubah sehingga hasil lama tidak pernah terpakai
+result_cache = ResultCache()
+MODEL_KEY = None
+
+# Job asinkron untuk gambar besar (POST /jobs, lalu polling GET /jobs/<id>)
+job_store = JobStore()
+
+
+def init_model():
+    global model, UINT8_IO, MODEL_KEY
+
+    # Coba muat model
+    try:
+        model = load_predictor(MODEL_PATH, backend=BACKEND)
+        print(f"✅ Model berhasil dimuat dari: {MODEL_PATH} (backend: {BACKEND})")
+        MODEL_KEY = f"{file_digest(MODEL_PATH)}:{BACKEND}:{PRECISION}"
+    except Exception as e:
+        print(f"❌ Gagal memuat model: {e}")
+        model = None
+    UINT8_IO = getattr(model, "uint8_io", False)
+
+
+def get_batcher():
+    # Thread scheduler tidak ikut tersalin saat proses di-fork (serve.py),
+    # jadi batcher dibuat ulang sekali per proses
+    global _batcher, _batcher_pid
+    with _batcher_lock:
+        if _batcher is None or _batcher_pid != os.getpid():
+            _batcher = MicroBatcher(
+                model,
+                max_batch_size=BATCH_MAX_SIZE,
+                max_wait_ms=BATCH_MAX_WAIT_MS,
+            )
+            _batcher_pid = os.getpid()
+        return _batcher
+
+
+def warm_up_model():
+    if model:
+        duration = warm_up(model, WARMUP_BATCH_SIZES)
+        print(f"🔥 Warm-up selesai dalam {duration:.2f} s (batch: {WARMUP_BATCH_SIZES})")
+    else:
+        print("⚠️ Model tidak tersedia, warm-up dilewati")
+    ready.set()
+
+
+# serve.py dapat menunda pemuatan model sampai setelah fork (RESTORE_DEFER_LOAD=1)
+if os.environ.get("RESTORE_DEFER_LOAD") != "1":
+    init_model()
 
 @app.route("/")
 def index():
     return jsonify({"message": "API Restorasi Citra Aktif!"})
 
-@app.route("/restore", methods=["POST"])
-def restore_image():
-    if "file" not in request.files:
-        return jsonify({"error": "Tidak ada file dikirim"}), 400
+@app.route("/ready")
+def readiness():
+    if not ready.is_set():
+        return jsonify({"status": "warming-up"}), 503
+    return jsonify({"status": "ready"})
 
-    file = request.files["file"]
+@app.route("/cache/stats")
+def cache_stats():
+    # Penghitung per proses worker; tier disk dipakai bersama
+    return jsonify({"pid": os.getpid(), **result_cache.stats()})
 
-    try:
-        img = Image.open(file.stream).convert("RGB")
-        img = img.resize((128, 128))
-        img_array = np.array(img) / 255.0
-        img_array = np.expand_dims(img_array, axis=0)
+def restore_pil(img, mode, stats=None):
+    if mode == "tiled":
+        if model:
+            predict_fn = get_batcher().predict
+        else:
+            # Fallback jika model gagal dimuat
+            predict_fn = lambda batch: 1 - batch
+        return Image.fromarray(
+            restore_tiled(np.array(img), predict_fn, batch_size=TILE_BATCH_SIZE,
+                          uint8_io=UINT8_IO, stats=stats)
+        )
+
+    if img.size != MODEL_INPUT_SIZE:
+        img = img.resize(MODEL_INPUT_SIZE)
+    if UINT8_IO:
+        restored = get_batcher().predict(np.array(img)[None])[0]
+    else:
+        img_array = np.array(img)[None] / np.float32(255.0)
 
         if model:
-            restored = model.predict(img_array)[0]
+            restored = get_batcher().predict(img_array)[0]
         else:
             # Fallback jika model gagal dimuat
             restored = 1 - img_array[0]
 
-        restored = (restored * 255).astype(np.uint8)
-        restored_img = Image.fromarray(restored)
+        restored = to_pixels(restored)
+    return Image.fromarray(restored)
+
+
+def restore_file(fp, mode, fmt="jpeg", options=None, stats=None):
+    # Decode -> restorasi -> encode untuk satu file; mengembalikan
+    # (byte hasil, format hasil, waktu encode dalam ms)
+    img = open_checked(fp)  # dimensi diperiksa dari header sebelum decode
+    if is_multiframe(img):
+        # GIF/APNG/WebP animasi dan TIFF multi-halaman: semua frame direstorasi
+        out_fmt = output_format(img, fmt)
+        frames = restore_frames(img, lambda frame: restore_pil(frame, mode, stats))
+        data, encode_ms = encode_frames(frames, out_fmt, options if out_fmt == fmt else None,
+                                        loop=img.info.get("loop"))
+        return data, out_fmt, encode_ms
+    if mode == "tiled":
+        img = img.convert("RGB")
+    else:
+        # Mode 128x128: decode langsung pada skala kecil (draft/reduce)
+        img = load_for_model(img)
+    data, encode_ms = encode(restore_pil(img, mode, stats), fmt, options)
+    return data, fmt, encode_ms
+
+
+def restore_cached(fp, mode, fmt="jpeg", options=None, stats=None):
+    # restore_file dengan cache hasil; mengembalikan
+    # (byte hasil, format hasil, waktu encode dalam ms, hit cache)
+    if not (result_cache.enabled and MODEL_KEY):
+        return (*restore_file(fp, mode, fmt, options, stats), False)
+    key = cache_key(stream_digest(fp), MODEL_KEY, mode, fmt, options)
+    cached = result_cache.get(key)
+    if cached is not None:
+        data, out_fmt = cached
+        return data, out_fmt, 0.0, True
+    data, out_fmt, encode_ms = restore_file(fp, mode, fmt, options, stats)
+    result_cache.put(key, data, out_fmt)
+    return data, out_fmt, encode_ms, False
+
+
+def request_params():
+    # Field form mengalahkan query string dengan nama yang sama
+    return {**request.args.to_dict(), **request.form.to_dict()}
+
+
+def parse_mode(params):
+    # Mode tak dikenal ditolak (400) agar tidak diam-diam menjadi "resize"
+    # dan tersimpan di cache dengan kunci mode yang salah
+    mode = params.get("mode") or RESTORE_MODE
+    if mode not in MODES:
+        raise ValueError(f"Mode tidak dikenal: {mode} (pilih {', '.join(MODES)})")
+    return mode
+
+
+def read_upload():
+    # Multipart (field "file") atau body mentah application/octet-stream / image/*
+    if "file" in request.files:
+        return request.files["file"].stream
+    if request.mimetype == "application/octet-stream" or request.mimetype.startswith("image/"):
+        # Tanpa Content-Length hanya diterima bila server mendukung chunked upload
+        if not request.content_length and not request.environ.get("wsgi.input_terminated"):
+            return None
+        # Body mentah dibaca per chunk ke spool (memori, lalu file sementara)
+        # dengan batas byte yang juga berlaku untuk chunked upload
+        return spool_stream(request.stream)
+    return None
+
+
+def prefers_json(accept, output_mimetype="image/jpeg"):
+    # Klien lama (Accept: */* atau application/json) tetap menerima JSON base64;
+    # klien yang meminta image/* atau octet-stream menerima byte gambar langsung
+    best = accept.best_match(["application/json", output_mimetype, "application/octet-stream"])
+    if best is None:
+        # Format hasil bisa berbeda dari yang diminta (mis. GIF animasi untuk
+        # Accept: image/jpeg); klien yang menerima gambar apa pun tetap dapat byte
+        return not any(value.startswith("image/") and quality > 0 for value, quality in accept)
+    return best == "application/json"
+
+
+def wants_json(output_mimetype="image/jpeg"):
+    return prefers_json(request.accept_mimetypes, output_mimetype)
 
-        buffer = BytesIO()
-        restored_img.save(buffer, format="JPEG")
-        encoded_image = base64.b64encode(buffer.getvalue()).decode("utf-8")
 
-        return jsonify({"restored_image": encoded_image})
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    return jsonify({"error": f"Ukuran file melebihi batas {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"}), 413
 
+
+@app.route("/restore", methods=["POST"])
+def restore_image():
+    try:
+        stream = read_upload()
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    if stream is None:
+        return jsonify({"error": "Tidak ada file dikirim"}), 400
+
+    try:
+        mode = parse_mode(request_params())
+        fmt, options = parse_options(request_params())
+    except ValueError as e:
+        stream.close()
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        tiles = TileStats()
+        data, fmt, encode_ms, cached = restore_cached(stream, mode, fmt, options, tiles)
+
+        if wants_json(mimetype(fmt)):
+            encoded_image = base64.b64encode(data).decode("utf-8")
+            response = jsonify({"restored_image": encoded_image, "format": fmt})
+        else:
+            response = Response(data, mimetype=mimetype(fmt))
+        response.vary.add("Accept")
+        # Biaya encode untuk memilih format termurah sesuai anggaran bandwidth
+        response.headers["X-Encode-Time-Ms"] = f"{encode_ms:.2f}"
+        response.headers["X-Encoded-Bytes"] = str(len(data))
+        response.headers["X-Cache"] = "HIT" if cached else "MISS"
+        # Tile identik yang hasilnya dipakai ulang tanpa inferensi
+        response.headers["X-Tiles-Total"] = str(tiles.tiles)
+        response.headers["X-Tiles-Skipped"] = str(tiles.skipped)
+        return response
+
+    except TooManyPixels as e:
+        return jsonify({"error": str(e)}), 413
     except Exception as e:
         print("❌ Error:", e)
         return jsonify({"error": str(e)}), 500
+    finally:
+        stream.close()
+
+
+@app.route("/jobs", methods=["POST"])
+def create_job():
+    # Seperti /restore, tetapi langsung dijawab 202 dengan id job; hasil
+    # diambil lewat GET /jobs/<id>/result setelah status "done"
+    try:
+        stream = read_upload()
+        if stream is not None and "file" in request.files:
+            # File multipart ditutup begitu request selesai, sedangkan job
+            # berjalan setelahnya
+            stream = spool_stream(stream)
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    if stream is None:
+        return jsonify({"error": "Tidak ada file dikirim"}), 400
+
+    try:
+        mode = parse_mode(request_params())
+        fmt, options = parse_options(request_params())
+    except ValueError as e:
+        stream.close()
+        return jsonify({"error": str(e)}), 400
+
+    def run():
+        try:
+            tiles = TileStats()
+            data, out_fmt, encode_ms, cached = restore_cached(stream, mode, fmt, options, tiles)
+        finally:
+            stream.close()
+        info = {"encode_ms": round(encode_ms, 2), "cache": "HIT" if cached else "MISS",
+                "tiles_total": tiles.tiles, "tiles_skipped": tiles.skipped}
+        return data, out_fmt, info
+
+    try:
+        job_id = job_store.submit(run)
+    except QueueFull as e:
+        stream.close()
+        response = jsonify({"error": str(e)})
+        response.headers["Retry-After"] = "5"
+        return response, 503
+    response = jsonify({"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}",
+                        "result_url": f"/jobs/{job_id}/result"})
+    response.headers["Location"] = f"/jobs/{job_id}"
+    return response, 202
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = job_store.status(job_id)
+    if job is None:
+        return jsonify({"error": "Job tidak ditemukan atau sudah kedaluwarsa"}), 404
+    if job["status"] == DONE:
+        job["result_url"] = f"/jobs/{job_id}/result"
+    return jsonify(job)
+
+
+@app.route("/jobs/<job_id>/result")
+def job_result(job_id):
+    job = job_store.status(job_id)
+    if job is None:
+        return jsonify({"error": "Job tidak ditemukan atau sudah kedaluwarsa"}), 404
+    if job["status"] == FAILED:
+        status = 413 if job.get("error_type") == TooManyPixels.__name__ else 500
+        return jsonify({"error": job["error"], "status": job["status"]}), status
+    result = job_store.result(job_id) if job["status"] == DONE else None
+    if result is None:
+        # Belum selesai; klien melanjutkan polling GET /jobs/<id>
+        response = jsonify({"error": "Job belum selesai", "status": job["status"]})
+        response.headers["Retry-After"] = "1"
+        return response, 409
+    data, fmt = result
+    if isinstance(data, str):
+        # Hasil di RESTORE_JOB_DIR dikirim langsung dari file
+        response = send_file(data, mimetype=mimetype(fmt), conditional=True)
+    else:
+        response = Response(data, mimetype=mimetype(fmt))
+    response.headers["X-Encode-Time-Ms"] = f"{job['encode_ms']:.2f}"
+    response.headers["X-Encoded-Bytes"] = str(job["bytes"])
+    response.headers["X-Cache"] = job["cache"]
+    return response
+
+
+@app.route("/jobs/stats")
+def job_stats():
+    return jsonify({"pid": os.getpid(), **job_store.stats()})
+
+
+def collect_batch_uploads():
+    # Multipart "files"/"file" (gambar atau ZIP) atau body mentah application/zip.
+    # Disalin ke spool sendiri karena file multipart ditutup begitu konteks
+    # request selesai, sedangkan hasil dikirim secara streaming setelahnya.
+    files = request.files.getlist("files") + request.files.getlist("file")
+    if files:
+        return [(f.filename or "gambar", f.mimetype, spool_stream(f.stream)) for f in files]
+    if is_zip("", request.mimetype):
+        return [("upload.zip", request.mimetype, spool_stream(request.stream))]
+    return []
+
+
+def iter_batch_sources(uploads):
+    for name, mimetype, fp in uploads:
+        if is_zip(name, mimetype):
+            yield from iter_zip_images(fp)
+        else:
+            yield name, (lambda fp=fp: fp)
+
+
+def stream_batch_zip(sources, mode, uploads, fmt="jpeg", options=None):
+    # Gambar didecode dan di-encode paralel; inferensinya bertemu di micro-batcher
+    # sehingga model menerima batch besar. Setiap hasil langsung ditulis sebagai
+    # entri ZIP dan dikirim, dengan jumlah gambar in-flight dibatasi.
+    stream = ZipStream()
+    used, errors = set(), []
+    window = BATCH_WORKERS * 2
+    count = 0
+
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_STORED) as out, \
+            ThreadPoolExecutor(BATCH_WORKERS, thread_name_prefix="restore-batch") as pool:
+        pending = {}
+
+        def fill():
+            nonlocal count
+            while len(pending) < window and count < MAX_BATCH_FILES:
+                try:
+                    name, opener = next(sources)
+                except StopIteration:
+                    return
+                count += 1
+                pending[pool.submit(lambda o=opener: restore_cached(o(), mode, fmt, options))] = name
+            if count == MAX_BATCH_FILES and next(sources, None) is not None:
+                errors.append(f"Batch dibatasi {MAX_BATCH_FILES} gambar; sisanya dilewati")
+                count += 1
+
+        fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    data, out_fmt, _, _ = future.result()
+                    out.writestr(output_name(name, used, extension(out_fmt)), data)
+                except Exception as e:
+                    errors.append(f"{name}: {e}")
+            fill()
+            yield stream.pop()
+        if errors:
+            out.writestr("errors.txt", "\n".join(errors) + "\n")
+    # Central directory ZIP ditulis saat arsip ditutup
+    yield stream.pop()
+    for _, _, fp in uploads:
+        fp.close()
+
+
+@app.route("/restore/batch", methods=["POST"])
+def restore_batch():
+    try:
+        mode = parse_mode(request_params())
+        fmt, options = parse_options(request_params())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        uploads = collect_batch_uploads()
+        sources = iter_batch_sources(uploads)
+        first = next(sources, None)
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except zipfile.BadZipFile:
+        return jsonify({"error": "Arsip ZIP tidak valid"}), 400
+    if first is None:
+        return jsonify({"error": "Tidak ada gambar dikirim"}), 400
+
+    sources = itertools.chain([first], sources)
+    return Response(
+        stream_with_context(stream_batch_zip(sources, mode, uploads, fmt, options)),
+        mimetype="application/zip",
+        headers={"Content-Disposition": "attachment; filename=hasil_restorasi.zip"},
+    )
 
 
 if __name__ == "__main__":
+    threading.Thread(target=warm_up_model, daemon=True).start()
     app.run(host="127.0.0.1", port=5000, debug=True)
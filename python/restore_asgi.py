@@ -0,0 +1,225 @@
+import argparse
+import asyncio
+import base64
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+import restore_api
+from encoders import mimetype, parse_options
+from tiling import TileStats
+from uploads import MAX_UPLOAD_BYTES, SPOOL_MEMORY_BYTES, TooManyPixels, UploadTooLarge
+
+# === Server ASGI ===
+# Varian asinkron dari restore_api.py dengan kontrak `/` dan `/restore` yang
+# sama. Upload dibaca secara async di event loop, sehingga koneksi yang lambat
+# atau menganggur tidak menahan thread. Decode, restorasi dan encode (yang
+# memakai CPU) dijalankan di executor berukuran tetap; inferensinya tetap
+# digabung oleh micro-batcher restore_api.
+#
+#   python restore_asgi.py --port 5000
+#   uvicorn restore_asgi:app --port 5000
+
+# Thread untuk pekerjaan CPU per proses; request lain menunggu sebagai coroutine
+CPU_WORKERS = int(os.environ.get("RESTORE_ASGI_CPU_WORKERS", str(os.cpu_count() or 1)))
+# Request yang boleh antre untuk executor; di atas itu dijawab 503
+MAX_QUEUED = int(os.environ.get("RESTORE_ASGI_MAX_QUEUED", str(CPU_WORKERS * 16)))
+
+executor = ThreadPoolExecutor(CPU_WORKERS, thread_name_prefix="restore-cpu")
+_slots = threading.BoundedSemaphore(CPU_WORKERS + MAX_QUEUED)
+
+
+class BodyLimit:
+    """Middleware ASGI yang membatasi ukuran body request.
+
+    Body dengan Content-Length di atas batas langsung dijawab 413 tanpa dibaca;
+    body chunked dihentikan dengan UploadTooLarge begitu melewati batas.
+    """
+
+    def __init__(self, app, limit=MAX_UPLOAD_BYTES):
+        self.app = app
+        self.limit = limit
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        length = dict(scope["headers"]).get(b"content-length")
+        if length and length.isdigit() and int(length) > self.limit:
+            response = upload_too_large(None, UploadTooLarge())
+            return await response(scope, receive, send)
+
+        total = 0
+
+        async def limited_receive():
+            nonlocal total
+            message = await receive()
+            if message["type"] == "http.request":
+                total += len(message.get("body", b""))
+                if total > self.limit:
+                    raise UploadTooLarge()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def upload_too_large(request, exc):
+    return JSONResponse(
+        {"error": f"Ukuran file melebihi batas {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"}, status_code=413
+    )
+
+
+async def spool_body(request):
+    # Body mentah disalin per chunk ke spool (memori, lalu file sementara)
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    try:
+        async for chunk in request.stream():
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+async def read_upload(request):
+    # Multipart (field "file") atau body mentah application/octet-stream / image/*;
+    # mengembalikan (file upload, parameter form) atau (None, parameter)
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == "multipart/form-data":
+        form = await request.form(max_files=1)
+        params = {key: value for key, value in form.items() if isinstance(value, str)}
+        upload = form.get("file")
+        if isinstance(upload, str) or upload is None:
+            await form.close()
+            return None, params
+        return upload.file, params
+    if content_type == "application/octet-stream" or content_type.startswith("image/"):
+        return await spool_body(request), {}
+    return None, {}
+
+
+def wants_json(request, output_mimetype="image/jpeg"):
+    # Aturan negosiasi yang sama dengan restore_api.wants_json
+    accept = parse_accept_header(request.headers.get("accept"), MIMEAccept)
+    return restore_api.prefers_json(accept, output_mimetype)
+
+
+async def run_cpu(fn, *args):
+    # Antre ke executor; bila antrean penuh request ditolak daripada menumpuk
+    if not _slots.acquire(blocking=False):
+        return None
+    try:
+        return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+    finally:
+        _slots.release()
+
+
+async def index(request):
+    return JSONResponse({"message": "API Restorasi Citra Aktif!"})
+
+
+async def readiness(request):
+    if not restore_api.ready.is_set():
+        return JSONResponse({"status": "warming-up"}, status_code=503)
+    return JSONResponse({"status": "ready"})
+
+
+async def cache_stats(request):
+    return JSONResponse({"pid": os.getpid(), **restore_api.result_cache.stats()})
+
+
+async def restore_image(request):
+    stream, form = await read_upload(request)
+    if stream is None:
+        return JSONResponse({"error": "Tidak ada file dikirim"}, status_code=400)
+
+    try:
+        # Field form mengalahkan query string dengan nama yang sama
+        params = {**request.query_params, **form}
+        mode = restore_api.parse_mode(params)
+        fmt, options = parse_options(params)
+    except ValueError as e:
+        stream.close()
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    try:
+        tiles = TileStats()
+        result = await run_cpu(restore_api.restore_cached, stream, mode, fmt, options, tiles)
+        if result is None:
+            return JSONResponse({"error": "Server sedang penuh, coba lagi"}, status_code=503,
+                                headers={"Retry-After": "1"})
+        data, fmt, encode_ms, cached = result
+
+        headers = {
+            "Vary": "Accept",
+            # Biaya encode untuk memilih format termurah sesuai anggaran bandwidth
+            "X-Encode-Time-Ms": f"{encode_ms:.2f}",
+            "X-Encoded-Bytes": str(len(data)),
+            "X-Cache": "HIT" if cached else "MISS",
+            # Tile identik yang hasilnya dipakai ulang tanpa inferensi
+            "X-Tiles-Total": str(tiles.tiles),
+            "X-Tiles-Skipped": str(tiles.skipped),
+        }
+        if wants_json(request, mimetype(fmt)):
+            encoded_image = base64.b64encode(data).decode("utf-8")
+            return JSONResponse({"restored_image": encoded_image, "format": fmt}, headers=headers)
+        return Response(data, media_type=mimetype(fmt), headers=headers)
+
+    except TooManyPixels as e:
+        return JSONResponse({"error": str(e)}, status_code=413)
+    except Exception as e:
+        print("❌ Error:", e)
+        return JSONResponse({"error": str(e)}, status_code=500)
+    finally:
+        stream.close()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Model dimuat saat restore_api diimpor; warm-up berjalan di latar dan
+    # /ready mengembalikan 503 sampai selesai
+    threading.Thread(target=restore_api.warm_up_model, daemon=True).start()
+    yield
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = Starlette(
+    routes=[
+        Route("/", index),
+        Route("/ready", readiness),
+        Route("/cache/stats", cache_stats),
+        Route("/restore", restore_image, methods=["POST"]),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=["*"]), Middleware(BodyLimit)],
+    exception_handlers={UploadTooLarge: upload_too_large},
+    lifespan=lifespan,
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Server ASGI API restorasi citra")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Proses uvicorn; setiap proses memuat model sendiri")
+    parser.add_argument("--limit-concurrency", type=int, default=None,
+                        help="Koneksi maksimal per proses sebelum dijawab 503")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    args = parse_args()
+    uvicorn.run("restore_asgi:app" if args.workers > 1 else app, host=args.host, port=args.port,
+                workers=args.workers, limit_concurrency=args.limit_concurrency)
@@ -0,0 +1,245 @@
+import argparse
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from batching import MicroBatcher
+from encoders import FORMAT_ALIASES, FORMATS, SUBSAMPLING, encode, extension, parse_options
+from imaging import MODEL_INPUT_SIZE, list_images, load_for_model
+from inference import BACKEND, load_predictor, to_pixels
+from tiling import BATCH_SIZE, restore_tiled
+from uploads import open_checked
+
+# === Restorasi Batch dari Folder ===
+# Pipeline tiga tahap dengan antrean terbatas di antaranya:
+#   decode (thread pool) -> inferensi (micro-batcher, batch besar) -> encode + tulis (thread pool)
+# Hasil ditulis atomik (file sementara lalu rename), sehingga run yang terputus
+# bisa dilanjutkan: file yang keluarannya sudah ada dilewati.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "../model/model_restorasi_citra.h5")
+_DONE = object()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Restorasi semua gambar di sebuah folder")
+    parser.add_argument("input", help="Folder sumber (dibaca rekursif)")
+    parser.add_argument("output", help="Folder hasil (struktur subfolder dipertahankan)")
+    parser.add_argument("--mode", choices=["tiled", "resize"], default="tiled")
+    parser.add_argument("--backend", default=BACKEND, choices=["tf", "numpy", "tflite", "int8"])
+    parser.add_argument("--format", choices=sorted([*FORMATS, *FORMAT_ALIASES]), default="jpeg")
+    parser.add_argument("--quality", type=int, help="Kualitas JPEG (1-95, default 95) atau WebP (0-100)")
+    parser.add_argument("--subsampling", choices=list(SUBSAMPLING), help="Subsampling kroma JPEG")
+    parser.add_argument("--progressive", action="store_true", default=None, help="JPEG progresif")
+    parser.add_argument("--lossless", action="store_true", default=None, help="WebP lossless")
+    parser.add_argument("--method", type=int, help="Upaya kompresi WebP (0 = cepat .. 6 = paling kecil)")
+    parser.add_argument("--compress-level", type=int, help="Level kompresi PNG (0-9)")
+    parser.add_argument("--decode-workers", type=int, default=4)
+    parser.add_argument("--infer-workers", type=int, default=4,
+                        help="Gambar yang diinferensi bersamaan (tile-nya digabung dalam satu batch)")
+    parser.add_argument("--encode-workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=64, help="Batch maksimal ke model")
+    parser.add_argument("--queue-size", type=int, default=16, help="Kapasitas antrean antar tahap")
+    parser.add_argument("--no-resume", action="store_true", help="Proses ulang file yang sudah ada hasilnya")
+    parser.add_argument("--report-every", type=float, default=10.0, help="Interval laporan progres (detik)")
+    return parser.parse_args()
+
+
+class Stats:
+    def __init__(self):
+        self.done = 0
+        self.skipped = 0
+        self.failed = 0
+        self.encode_ms = 0.0
+        self.encoded_bytes = 0
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def add_encode(self, ms, size):
+        with self._lock:
+            self.encode_ms += ms
+            self.encoded_bytes += size
+
+    def rate(self):
+        return self.done / max(time.perf_counter() - self.start, 1e-9)
+
+
+def output_path(args, path, keep_extension=False):
+    rel = os.path.relpath(path, args.input)
+    if not keep_extension:
+        rel = os.path.splitext(rel)[0]
+    return os.path.join(args.output, rel + extension(args.fmt))
+
+
+def output_paths(args, paths):
+    """Petakan setiap sumber ke file hasil yang unik.
+
+    Sumber dengan nama dasar sama (scan.jpg dan scan.png) akan menjadi file
+    hasil yang sama; untuk sumber seperti itu ekstensi aslinya dipertahankan
+    (scan.jpg.webp, scan.png.webp). Nama lain tidak berubah, sehingga resume
+    tetap mengenali hasil lama. ValueError bila masih ada bentrokan.
+    """
+    targets = {path: output_path(args, path) for path in paths}
+    groups = {}
+    for path, target in targets.items():
+        groups.setdefault(os.path.normcase(target), []).append(path)
+    for group in groups.values():
+        if len(group) > 1:
+            for path in group:
+                targets[path] = output_path(args, path, keep_extension=True)
+
+    seen = {}
+    for path, target in targets.items():
+        other = seen.setdefault(os.path.normcase(target), path)
+        if other != path:
+            raise ValueError(f"{other} dan {path} menghasilkan file yang sama: {target}")
+    return targets
+
+
+def run_stage(worker, count, inbox, outbox):
+    # Jalankan `count` thread yang memproses item dari inbox ke outbox; sentinel
+    # _DONE diteruskan ke tahap berikutnya setelah semua thread selesai
+    remaining = [count]
+    lock = threading.Lock()
+
+    def loop():
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                inbox.put(_DONE)
+                break
+            result = worker(item)
+            if result is not None and outbox is not None:
+                outbox.put(result)
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last and outbox is not None:
+            outbox.put(_DONE)
+
+    threads = [threading.Thread(target=loop, daemon=True) for _ in range(count)]
+    for t in threads:
+        t.start()
+    return threads
+
+
+def main():
+    args = parse_args()
+    params = {
+        "format": args.format,
+        "quality": args.quality,
+        "subsampling": args.subsampling,
+        "progressive": args.progressive,
+        "lossless": args.lossless,
+        "method": args.method,
+        "compress_level": args.compress_level,
+    }
+    try:
+        args.fmt, options = parse_options(params)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    if args.fmt == "jpeg":
+        options.setdefault("quality", 95)
+    paths = list_images(args.input)
+    print(f"📂 {len(paths)} gambar ditemukan di {args.input}")
+    try:
+        targets = output_paths(args, paths)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+
+    model = load_predictor(MODEL_PATH, backend=args.backend)
+    uint8_io = getattr(model, "uint8_io", False)
+    batcher = MicroBatcher(model, max_batch_size=args.batch_size, max_wait_ms=20)
+    stats = Stats()
+
+    path_q = queue.Queue(maxsize=args.queue_size)
+    decoded_q = queue.Queue(maxsize=args.queue_size)
+    restored_q = queue.Queue(maxsize=args.queue_size)
+
+    def fail(path, e):
+        stats.add("failed")
+        print(f"❌ {path}: {e}", file=sys.stderr)
+
+    def decode(path):
+        try:
+            img = open_checked(path)
+            if args.mode == "tiled":
+                return path, np.array(img.convert("RGB"))
+            return path, np.array(load_for_model(img, MODEL_INPUT_SIZE))
+        except Exception as e:
+            fail(path, e)
+
+    def infer(item):
+        path, arr = item
+        try:
+            if args.mode == "tiled":
+                return path, restore_tiled(arr, batcher.predict, batch_size=BATCH_SIZE, uint8_io=uint8_io)
+            if uint8_io:
+                return path, batcher.predict(arr[None])[0]
+            restored = batcher.predict(arr[None] / np.float32(255.0))[0]
+            return path, to_pixels(restored)
+        except Exception as e:
+            fail(path, e)
+
+    def write(item):
+        path, arr = item
+        target = targets[path]
+        try:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            data, encode_ms = encode(Image.fromarray(arr), args.fmt, options)
+            tmp = target + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, target)
+            stats.add_encode(encode_ms, len(data))
+            stats.add("done")
+        except Exception as e:
+            fail(path, e)
+
+    stages = [
+        run_stage(decode, args.decode_workers, path_q, decoded_q),
+        run_stage(infer, args.infer_workers, decoded_q, restored_q),
+        run_stage(write, args.encode_workers, restored_q, None),
+    ]
+
+    def report():
+        while True:
+            time.sleep(args.report_every)
+            print(f"⏱️ {stats.done} selesai, {stats.skipped} dilewati, {stats.failed} gagal "
+                  f"- {stats.rate():.1f} gambar/s", flush=True)
+
+    threading.Thread(target=report, daemon=True).start()
+
+    for path in paths:
+        if not args.no_resume and os.path.exists(targets[path]):
+            stats.skipped += 1
+            continue
+        path_q.put(path)
+    path_q.put(_DONE)
+    for threads in stages:
+        for t in threads:
+            t.join()
+
+    elapsed = time.perf_counter() - stats.start
+    print(f"✅ Selesai dalam {elapsed:.1f} s: {stats.done} gambar ({stats.rate():.1f} gambar/s), "
+          f"{stats.skipped} dilewati (sudah ada), {stats.failed} gagal")
+    print(f"   Rata-rata batch model: {batcher.items / max(batcher.batches, 1):.1f}")
+    if stats.done:
+        print(f"   Encode {args.fmt}: {stats.encode_ms / stats.done:.1f} ms/gambar, "
+              f"rata-rata {stats.encoded_bytes / stats.done / 1024:.0f} KB")
+    return 1 if stats.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
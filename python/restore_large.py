@@ -0,0 +1,68 @@
+import argparse
+import os
+import sys
+import time
+
+from bands import (BAND_ROWS, DECODE_MAX_MB, MAX_PIXELS, OUTPUT_EXTENSIONS, BandReader, open_writer,
+                   restore_banded)
+from inference import BACKEND, load_predictor
+
+# === Restorasi Gambar Sangat Besar ===
+# Memproses satu gambar (ratusan megapiksel) per band tanpa memuat seluruhnya
+# ke memori. Format keluaran ditentukan dari ekstensi: .npy (memmap), .png
+# atau .tif.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "../model/model_restorasi_citra.h5")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Restorasi out-of-core untuk gambar sangat besar")
+    parser.add_argument("input", help="Gambar sumber (TIFF/BMP/PPM tak terkompresi, PNG 8-bit dan .npy dibaca per band)")
+    parser.add_argument("output", help=f"File hasil ({', '.join(OUTPUT_EXTENSIONS)})")
+    parser.add_argument("--backend", default=BACKEND, choices=["tf", "numpy", "tflite", "int8"])
+    parser.add_argument("--band-rows", type=int, default=BAND_ROWS, help="Baris inti per band")
+    parser.add_argument("--compress-level", type=int, default=6,
+                        help="Level deflate PNG/TIFF (0 = TIFF tak terkompresi)")
+    parser.add_argument("--max-pixels", type=int, default=MAX_PIXELS)
+    parser.add_argument("--decode-max-mb", type=int, default=DECODE_MAX_MB,
+                        help="Anggaran memori untuk format yang harus didecode penuh (mis. JPEG)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        reader = BandReader(args.input, max_pixels=args.max_pixels, decode_max_mb=args.decode_max_mb)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"📐 {args.input}: {reader.width}x{reader.height} ({reader.width * reader.height / 1e6:.0f} MP), "
+          f"band {args.band_rows} baris")
+
+    model = load_predictor(MODEL_PATH, backend=args.backend)
+    tmp = args.output + ".tmp" + os.path.splitext(args.output)[1]
+    writer = open_writer(tmp, reader.width, reader.height, args.band_rows, args.compress_level)
+    start = time.perf_counter()
+
+    def progress(done, total):
+        elapsed = time.perf_counter() - start
+        print(f"⏱️ {done}/{total} baris ({done * reader.width / elapsed / 1e6:.2f} MP/s)", flush=True)
+
+    try:
+        restore_banded(reader, writer, model, band_rows=args.band_rows,
+                       uint8_io=getattr(model, "uint8_io", False), progress=progress)
+        writer.close()
+        os.replace(tmp, args.output)
+    except BaseException:
+        writer.abort()
+        os.remove(tmp)
+        raise
+    finally:
+        reader.close()
+    print(f"✅ Selesai dalam {time.perf_counter() - start:.1f} s: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+import argparse
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+# === Server Produksi Pre-fork ===
+# Proses induk membuka socket dan (bila backend aman di-fork) memuat model
+# sekali, lalu mem-fork N worker yang berbagi bobot secara copy-on-write.
+# Setiap worker menjalankan server WSGI sendiri pada socket yang sama.
+#
+# Sinyal ke proses induk:
+#   SIGHUP          restart bergilir: satu worker diganti setiap kali, worker
+#                   lama dihentikan setelah penggantinya siap (warm-up selesai)
+#   SIGTERM/SIGINT  hentikan server setelah request yang berjalan selesai
+
+# Runtime TensorFlow dan threadpool XNNPACK tidak aman di-fork setelah
+# diinisialisasi, jadi backend tersebut dimuat di masing-masing worker
+PRELOAD_BACKENDS = ("numpy",)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Server pre-fork API restorasi citra")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads-per-worker", type=int, default=1,
+                        help="Thread intra-op inferensi per worker")
+    parser.add_argument("--inter-op-threads", type=int, default=1,
+                        help="Thread inter-op TensorFlow per worker")
+    parser.add_argument("--pin-cpus", action="store_true",
+                        help="Kunci worker ke-i pada core [i*T, (i+1)*T) (T = threads-per-worker)")
+    parser.add_argument("--max-requests", type=int, default=0,
+                        help="Restart worker setelah sejumlah request (0 = tanpa batas)")
+    return parser.parse_args()
+
+
+class RequestCounter:
+    # Middleware WSGI yang memanggil `on_limit` setelah `limit` request
+    def __init__(self, app, limit, on_limit):
+        self.app = app
+        self.limit = limit
+        self.on_limit = on_limit
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, environ, start_response):
+        with self._lock:
+            self.count += 1
+            reached = self.limit and self.count == self.limit
+        if reached:
+            self.on_limit()
+        return self.app(environ, start_response)
+
+
+def worker_cpus(slot, args):
+    if not args.pin_cpus:
+        return None
+    from inference import available_cpus
+
+    cpus = available_cpus()
+    start = slot * args.threads_per_worker
+    return {cpus[(start + i) % len(cpus)] for i in range(args.threads_per_worker)}
+
+
+def run_worker(sock, args, preloaded, slot, ready_fd):
+    from werkzeug.serving import make_server
+
+    import restore_api
+    from inference import configure_threads
+
+    # Handler milik induk ikut tersalin saat fork; kembalikan ke default
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGHUP, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    cpus = worker_cpus(slot, args)
+    if preloaded:
+        # Jumlah thread sudah diatur di induk; afinitas tetap per worker
+        if cpus:
+            os.sched_setaffinity(0, cpus)
+    else:
+        configure_threads(args.threads_per_worker, args.inter_op_threads, cpus)
+        restore_api.init_model()
+    # Worker baru menerima koneksi setelah warm-up, sehingga request pertama
+    # tidak membayar biaya tracing dan pemilihan kernel
+    restore_api.warm_up_model()
+
+    server = None
+
+    def stop(*_):
+        # shutdown() harus dipanggil dari thread lain selain serve_forever
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    app = RequestCounter(restore_api.app, args.max_requests, stop)
+    server = make_server(args.host, args.port, app, threaded=True, fd=sock.fileno())
+    # Tunggu request yang sedang berjalan sebelum worker keluar
+    server.daemon_threads = False
+    signal.signal(signal.SIGTERM, stop)
+
+    print(f"👷 Worker {os.getpid()} siap" + (f" (CPU {sorted(cpus)})" if cpus else ""))
+    # Beri tahu induk bahwa worker ini sudah bisa melayani (restart bergilir)
+    os.write(ready_fd, b"1")
+    os.close(ready_fd)
+    server.serve_forever()
+    server.server_close()
+    print(f"👋 Worker {os.getpid()} berhenti setelah {app.count} request")
+
+
+def main():
+    args = parse_args()
+
+    from inference import BACKEND, configure_threads
+
+    preloaded = BACKEND in PRELOAD_BACKENDS
+    if preloaded:
+        configure_threads(args.threads_per_worker, args.inter_op_threads)
+    else:
+        os.environ["RESTORE_DEFER_LOAD"] = "1"
+    # Job /jobs disimpan per proses kecuali RESTORE_JOB_DIR diset; dengan
+    # beberapa worker, polling bisa jatuh ke worker lain, jadi semua worker
+    # berbagi satu folder milik induk
+    job_dir = None
+    if args.workers > 1 and not os.environ.get("RESTORE_JOB_DIR"):
+        job_dir = tempfile.mkdtemp(prefix="restore-jobs-")
+        os.environ["RESTORE_JOB_DIR"] = job_dir
+    import restore_api  # noqa: F401  (memuat model di induk bila preloaded)
+
+    sock = socket.create_server((args.host, args.port), backlog=128)
+    sock.set_inheritable(True)
+
+    # pid -> (slot, waktu start, fd baca pipe "siap")
+    workers = {}
+    state = {"stopping": False, "restart": False}
+
+    def spawn(slot):
+        ready_r, ready_w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_r)
+            code = 0
+            try:
+                run_worker(sock, args, preloaded, slot, ready_w)
+            except Exception as e:
+                print(f"❌ Worker {os.getpid()} gagal: {e}")
+                code = 1
+            finally:
+                sys.stdout.flush()
+                os._exit(code)
+        os.close(ready_w)
+        workers[pid] = (slot, time.monotonic(), ready_r)
+        return pid
+
+    def retire(pid):
+        # Worker yang dilepas tidak di-spawn ulang saat di-reap
+        _, _, ready_r = workers.pop(pid)
+        os.close(ready_r)
+        os.kill(pid, signal.SIGTERM)
+
+    def stop_all(*_):
+        state["stopping"] = True
+        for pid in list(workers):
+            os.kill(pid, signal.SIGTERM)
+
+    def request_restart(*_):
+        state["restart"] = True
+
+    def rolling_restart():
+        # Worker lain tetap melayani selama pengganti memuat model dan warm-up,
+        # sehingga kapasitas hanya berkurang paling banyak satu worker
+        print("🔄 Restart bergilir semua worker")
+        for old_pid in list(workers):
+            if state["stopping"]:
+                return
+            if old_pid not in workers:
+                continue
+            new_pid = spawn(workers[old_pid][0])
+            # Blok sampai pengganti menulis "siap"; EOF berarti gagal sebelum siap
+            if os.read(workers[new_pid][2], 1) != b"1":
+                print(f"❌ Worker pengganti {new_pid} gagal, restart dibatalkan")
+                os.close(workers.pop(new_pid)[2])
+                return
+            retire(old_pid)
+        print("✅ Restart bergilir selesai")
+
+    signal.signal(signal.SIGTERM, stop_all)
+    signal.signal(signal.SIGINT, stop_all)
+    signal.signal(signal.SIGHUP, request_restart)
+
+    print(f"🚀 Server pre-fork di http://{args.host}:{args.port} "
+          f"({args.workers} worker x {args.threads_per_worker} thread, backend: {BACKEND})")
+    for slot in range(args.workers):
+        spawn(slot)
+
+    while workers:
+        if state["restart"]:
+            state["restart"] = False
+            rolling_restart()
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            # waitpid/sleep dilanjutkan setelah handler sinyal (PEP 475), jadi
+            # permintaan restart dicek secara berkala
+            time.sleep(0.2)
+            continue
+        entry = workers.pop(pid, None)
+        if entry is None:
+            continue
+        slot, started, ready_r = entry
+        os.close(ready_r)
+        if state["stopping"]:
+            continue
+        if os.waitstatus_to_exitcode(status) != 0 and time.monotonic() - started < 1:
+            # Hindari loop fork cepat bila worker langsung gagal
+            time.sleep(1)
+        spawn(slot)
+
+    sock.close()
+    if job_dir:
+        shutil.rmtree(job_dir, ignore_errors=True)
+    print("🛑 Server berhenti")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import argparse
+import os
+import threading
+
+import numpy as np
+
+# === Backend TFLite ===
+# Model .h5 dikonversi sekali menjadi artifact .tflite, lalu dijalankan dengan
+# interpreter TFLite yang memakai delegate XNNPACK untuk konvolusi di CPU.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "../model/model_restorasi_citra.h5")
+
+
+def default_tflite_path(h5_path):
+    return os.path.splitext(h5_path)[0] + ".tflite"
+
+
+def default_int8_path(h5_path):
+    return os.path.splitext(h5_path)[0] + "_int8.tflite"
+
+
+def convert(h5_path=MODEL_PATH, out_path=None):
+    import tensorflow as tf
+
+    out_path = out_path or default_tflite_path(h5_path)
+    model = tf.keras.models.load_model(h5_path, compile=False)
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    with open(out_path, "wb") as f:
+        f.write(converter.convert())
+    return out_path
+
+
+def _default_threads():
+    # Dibaca saat model dibuat agar configure_threads() ikut berlaku
+    return int(os.environ.get("RESTORE_TFLITE_THREADS", "0")) or None
+
+
+def _interpreter_class():
+    # Utamakan runtime ringan tanpa TensorFlow bila terpasang
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        pass
+    try:
+        from tflite_runtime.interpreter import Interpreter
+        return Interpreter
+    except ImportError:
+        import tensorflow as tf
+        return tf.lite.Interpreter
+
+
+class TFLiteModel:
+    dtype = np.float32
+    uint8_io = False
+
+    def __init__(self, path, num_threads=None):
+        Interpreter = _interpreter_class()
+        num_threads = num_threads or _default_threads()
+        # Op resolver bawaan (AUTO) otomatis menerapkan delegate XNNPACK
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads)
+        self._input = self.interpreter.get_input_details()[0]["index"]
+        self._output = self.interpreter.get_output_details()[0]["index"]
+        self._batch_size = None
+        self._lock = threading.Lock()
+
+    def _resize(self, shape):
+        if self._batch_size != shape[0]:
+            self.interpreter.resize_tensor_input(self._input, list(shape))
+            self.interpreter.allocate_tensors()
+            self._batch_size = shape[0]
+
+    def __call__(self, batch):
+        batch = np.asarray(batch, dtype=self.dtype)
+        # Interpreter tidak thread-safe
+        with self._lock:
+            self._resize(batch.shape)
+            self.interpreter.set_tensor(self._input, batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output)
+
+
+def _requant_lut(scale, zero_point, to_pixels):
+    # Tabel 256 entri untuk memetakan nilai uint8 antara domain piksel (0..255)
+    # dan domain terkuantisasi model; None bila pemetaannya identitas.
+    q = np.arange(256, dtype=np.float64)
+    if to_pixels:
+        values = (q - zero_point) * scale * 255.0
+    else:
+        values = q / 255.0 / scale + zero_point
+    lut = np.clip(np.rint(values), 0, 255).astype(np.uint8)
+    return None if np.array_equal(lut, np.arange(256)) else lut
+
+
+class QuantizedModel(TFLiteModel):
+    """Model int8 penuh dengan input dan output uint8.
+
+    Input dan output berupa piksel uint8 langsung, sehingga langkah `/ 255.0`
+    dan `* 255` di host tidak diperlukan. Bila parameter kuantisasi hasil
+    kalibrasi tidak tepat 1/255, piksel dipetakan lewat tabel 256 entri.
+    """
+
+    dtype = np.uint8
+    uint8_io = True
+
+    def __init__(self, path, num_threads=None):
+        super().__init__(path, num_threads=num_threads)
+        scale, zero_point = self.interpreter.get_input_details()[0]["quantization"]
+        self._in_lut = _requant_lut(scale, zero_point, to_pixels=False)
+        scale, zero_point = self.interpreter.get_output_details()[0]["quantization"]
+        self._out_lut = _requant_lut(scale, zero_point, to_pixels=True)
+
+    def __call__(self, batch):
+        batch = np.asarray(batch, dtype=np.uint8)
+        if self._in_lut is not None:
+            batch = self._in_lut[batch]
+        restored = super().__call__(batch)
+        if self._out_lut is not None:
+            restored = self._out_lut[restored]
+        return restored
+
+
+def load_int8(h5_path, num_threads=None):
+    path = default_int8_path(h5_path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"Model int8 belum ada di {path}; jalankan python/quantize.py --calib-dir <folder gambar>"
+        )
+    return QuantizedModel(path, num_threads=num_threads)
+
+
+def load_tflite(h5_path, num_threads=None):
+    path = default_tflite_path(h5_path)
+    if not os.path.exists(path):
+        print(f"ℹ️ Artifact TFLite belum ada, mengonversi {h5_path}")
+        convert(h5_path, path)
+    return TFLiteModel(path, num_threads=num_threads)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Konversi model .h5 ke .tflite")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    print("✅ Artifact TFLite disimpan di:", convert(args.model, args.output))
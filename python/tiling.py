@@ -0,0 +1,149 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+from inference import to_pixels
+
+# === Konfigurasi Tiling ===
+# Model menerima input tetap 128x128 dan terdiri dari lima layer 3x3 stride 1
+# dengan padding "same", sehingga receptive field-nya 11x11 (radius 5 piksel).
+# Setiap tile 128x128 hanya dipakai bagian tengahnya (118x118); sisanya (halo)
+# menjadi konteks agar hasil sambungan antar tile identik dengan inferensi
+# penuh pada resolusi asli.
+#
+# Batasan: gambar yang lebar atau tingginya kurang dari 128 piksel dipadding
+# sampai satu tile (lihat _pad_to_tile). Padding "same" model kemudian jatuh
+# di tepi padding, bukan di tepi gambar, sehingga piksel di dekat tepi tersebut
+# bisa berbeda dari inferensi penuh pada ukuran asli (pada gambar 70x50 sekitar
+# 12% piksel berbeda lebih dari 1 level, hingga puluhan level). Gambar
+# >= 128x128 tidak terpengaruh.
+TILE_SIZE = 128
+HALO = 5
+BATCH_SIZE = 16
+# Tile identik (termasuk halo), mis. area kertas putih atau latar studio,
+# hanya diinferensi sekali per gambar. Hasil window yang sudah dihitung
+# disimpan paling banyak DEDUP_MAX_ENTRIES (~50 KB per entri uint8).
+TILE_DEDUP = os.environ.get("RESTORE_TILE_DEDUP", "1") == "1"
+DEDUP_MAX_ENTRIES = 256
+
+
+class TileStats:
+    # Penghitung tile per request; aman dipakai beberapa thread (frame)
+    def __init__(self):
+        self.tiles = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+    def add(self, tiles, skipped):
+        with self._lock:
+            self.tiles += tiles
+            self.skipped += skipped
+
+
+def _axis_windows(length, tile, halo):
+    # Bagi satu sumbu menjadi (awal_window, awal_inti, akhir_inti).
+    # Inti tile membentuk partisi [0, length) tanpa tumpang tindih, window
+    # digeser ke dalam gambar di tepi supaya padding "same" model jatuh tepat
+    # di batas gambar asli.
+    step = tile - 2 * halo
+    windows = []
+    core_start = 0
+    while core_start < length:
+        core_end = min(core_start + step, length)
+        start = min(max(core_start - halo, 0), max(length - tile, 0))
+        windows.append((start, core_start, core_end))
+        core_start = core_end
+    return windows
+
+
+def iter_tiles(height, width, tile=TILE_SIZE, halo=HALO):
+    for y0, cy0, cy1 in _axis_windows(height, tile, halo):
+        for x0, cx0, cx1 in _axis_windows(width, tile, halo):
+            yield y0, x0, (cy0, cy1, cx0, cx1)
+
+
+def _pad_to_tile(img, tile):
+    # Gambar yang lebih kecil dari satu tile dipantulkan (reflect) agar
+    # ukurannya cukup untuk input model. Hasil di sumbu yang dipadding hanya
+    # mendekati inferensi pada ukuran asli (lihat batasan di atas).
+    pad_y = max(tile - img.shape[0], 0)
+    pad_x = max(tile - img.shape[1], 0)
+    if not pad_y and not pad_x:
+        return img
+    mode = "reflect" if min(img.shape[:2]) > 1 else "edge"
+    return np.pad(img, ((0, pad_y), (0, pad_x), (0, 0)), mode=mode)
+
+
+def restore_tiled(img, predict_fn, tile=TILE_SIZE, halo=HALO, batch_size=BATCH_SIZE, out=None,
+                  uint8_io=False, dedup=TILE_DEDUP, stats=None):
+    """Restorasi citra uint8 (H, W, 3) pada resolusi asli secara per tile.
+
+    `predict_fn` menerima batch float32 [N, tile, tile, 3] bernilai 0..1 dan
+    mengembalikan batch dengan bentuk yang sama, atau batch piksel uint8 bila
+    `uint8_io` aktif. Memori puncak dibatasi oleh `batch_size` tile, bukan
+    oleh ukuran gambar. Untuk gambar >= tile x tile hasilnya identik dengan
+    inferensi penuh; sisi yang lebih kecil dari tile dipadding (perkiraan).
+
+    Dengan `dedup`, window yang isinya sama persis hanya dikirim ke model
+    sekali. Jumlah tile dan tile yang dilewati ditambahkan ke `stats`
+    (TileStats) bila diberikan.
+    """
+    height, width = img.shape[:2]
+    src = _pad_to_tile(img, tile)
+    if out is None:
+        out = np.empty((height, width, 3), dtype=np.uint8)
+
+    batch = np.empty((batch_size, tile, tile, 3), dtype=np.uint8 if uint8_io else np.float32)
+    pending = []
+    # hash window -> hasil model; hash window di batch -> tile lain yang menunggu
+    done = {}
+    waiting = {}
+    total = skipped = 0
+
+    def place(restored, y0, x0, core):
+        cy0, cy1, cx0, cx1 = core
+        core = restored[cy0 - y0:cy1 - y0, cx0 - x0:cx1 - x0]
+        out[cy0:cy1, cx0:cx1] = core if uint8_io else to_pixels(core)
+
+    def flush():
+        restored = predict_fn(batch[:len(pending)])
+        for i, (key, y0, x0, core) in enumerate(pending):
+            place(restored[i], y0, x0, core)
+            if key is not None:
+                for dup in waiting.pop(key):
+                    place(restored[i], *dup)
+                if len(done) < DEDUP_MAX_ENTRIES:
+                    done[key] = restored[i].copy()
+        pending.clear()
+
+    for y0, x0, core in iter_tiles(src.shape[0], src.shape[1], tile, halo):
+        cy0, cy1, cx0, cx1 = core
+        # Inti tile yang seluruhnya berada di area padding tidak perlu diproses
+        if cy0 >= height or cx0 >= width:
+            continue
+        core = (cy0, min(cy1, height), cx0, min(cx1, width))
+        window = src[y0:y0 + tile, x0:x0 + tile]
+        total += 1
+        key = None
+        if dedup:
+            key = hashlib.blake2b(np.ascontiguousarray(window).data, digest_size=16).digest()
+            if key in done:
+                place(done[key], y0, x0, core)
+                skipped += 1
+                continue
+            if key in waiting:
+                waiting[key].append((y0, x0, core))
+                skipped += 1
+                continue
+            waiting[key] = []
+        batch[len(pending)] = window if uint8_io else window / np.float32(255.0)
+        pending.append((key, y0, x0, core))
+        if len(pending) == batch_size:
+            flush()
+    if pending:
+        flush()
+    if stats is not None:
+        stats.add(total, skipped)
+    return out
@@ -0,0 +1,61 @@
+import os
+import tempfile
+
+from PIL import Image
+
+# === Batas Upload ===
+# Batas ukuran body upload (MB) dan jumlah piksel maksimal gambar. Batas piksel
+# diperiksa dari header sebelum decode, sehingga decompression bomb (file kecil
+# dengan dimensi raksasa) ditolak tanpa pernah dialokasikan.
+MAX_UPLOAD_MB = int(os.environ.get("RESTORE_MAX_UPLOAD_MB", "50"))
+MAX_UPLOAD_BYTES = MAX_UPLOAD_MB * 1024 * 1024
+MAX_PIXELS = int(os.environ.get("RESTORE_MAX_PIXELS", "50000000"))
+# Body di atas ukuran ini dipindahkan dari memori ke file sementara
+SPOOL_MEMORY_BYTES = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class TooManyPixels(ValueError):
+    pass
+
+
+def spool_stream(stream, limit=MAX_UPLOAD_BYTES):
+    """Salin stream ke SpooledTemporaryFile per chunk dengan batas byte.
+
+    Upload dihentikan begitu melebihi `limit`, tanpa menunggu body selesai.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    total = 0
+    try:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            total += len(chunk)
+            if total > limit:
+                raise UploadTooLarge(f"Ukuran file melebihi batas {limit // (1024 * 1024)} MB")
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def open_checked(fp, max_pixels=MAX_PIXELS):
+    # Image.open hanya membaca header; piksel belum didecode di sini.
+    # Pillow sendiri menolak gambar di atas 2x MAX_IMAGE_PIXELS-nya.
+    try:
+        img = Image.open(fp)
+    except Image.DecompressionBombError as e:
+        raise TooManyPixels(f"Resolusi melebihi batas {max_pixels / 1e6:.0f} megapiksel") from e
+    width, height = img.size
+    if width * height > max_pixels:
+        raise TooManyPixels(
+            f"Resolusi {width}x{height} melebihi batas {max_pixels / 1e6:.0f} megapiksel"
+        )
+    return img
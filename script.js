@@ -8,6 +8,18 @@ const loadingText = document.getElementById("loading-text");
 const originalPlaceholder = document.getElementById("original-placeholder");
 const restoredPlaceholder = document.getElementById("restored-placeholder");
 
+// Object URL hasil restorasi, dilepas saat diganti atau di-reset
+let restoredUrl = null;
+
+// Ekstensi file download sesuai Content-Type hasil
+const DOWNLOAD_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+    "image/tiff": ".tif",
+};
+
 // Sembunyikan tombol di awal
 restoreButton.classList.add("hidden");
 resetButton.classList.add("hidden");
@@ -39,18 +51,21 @@ restoreButton.addEventListener("click", async function () {
         return;
     }
 
-    const formData = new FormData();
-    formData.append("file", file);
-
     loadingText.classList.remove("hidden");
     restoreButton.disabled = true;
     resetButton.disabled = true;
     downloadButton.classList.add("hidden");
 
     try {
+        // Kirim file mentah dan terima byte gambar langsung (tanpa base64/JSON)
         const response = await fetch("http://127.0.0.1:5000/restore", {
             method: "POST",
-            body: formData,
+            headers: {
+                "Content-Type": file.type || "application/octet-stream",
+                // Hasil animasi dikirim sebagai GIF/PNG/WebP, bukan JPEG
+                "Accept": "image/*",
+            },
+            body: file,
         });
 
         if (!response.ok) {
@@ -58,21 +73,21 @@ restoreButton.addEventListener("click", async function () {
             throw new Error("Gagal memproses gambar: " + errorText);
         }
 
-        const data = await response.json();
+        const blob = await response.blob();
+        if (restoredUrl) URL.revokeObjectURL(restoredUrl);
+        restoredUrl = URL.createObjectURL(blob);
 
-        if (data.restored_image) {
-            // tampilkan hasil
-            restoredImage.src = `data:image/jpeg;base64,${data.restored_image}`;
-            restoredImage.classList.remove("hidden");
-            restoredPlaceholder.classList.add("hidden");
-            originalImage.classList.remove("hidden");
+        // tampilkan hasil
+        restoredImage.src = restoredUrl;
+        restoredImage.classList.remove("hidden");
+        restoredPlaceholder.classList.add("hidden");
+        originalImage.classList.remove("hidden");
 
-            // ✅ aktifkan tombol download
-            downloadButton.href = `data:image/jpeg;base64,${data.restored_image}`;
-            downloadButton.classList.remove("hidden");
-        } else {
-            alert("Gagal memproses gambar: " + (data.error || "Tidak diketahui"));
-        }
+        // ✅ aktifkan tombol download
+        downloadButton.href = restoredUrl;
+        const contentType = (response.headers.get("Content-Type") || "").split(";")[0].trim();
+        downloadButton.download = "hasil_restorasi" + (DOWNLOAD_EXTENSIONS[contentType] || ".jpg");
+        downloadButton.classList.remove("hidden");
     } catch (error) {
         console.error("Error:", error);
         alert("❌ Tidak dapat terhubung ke server Flask atau terjadi kesalahan.");
@@ -84,6 +99,10 @@ restoreButton.addEventListener("click", async function () {
 });
 
 resetButton.addEventListener("click", function () {
+    if (restoredUrl) {
+        URL.revokeObjectURL(restoredUrl);
+        restoredUrl = null;
+    }
     uploadInput.value = "";
     originalImage.src = "";
     restoredImage.src = "";